@@ -0,0 +1,103 @@
+"""
+Benchmark: auth-path latency with and without the verified-token cache
+
+    cd Backend
+    python -m benchmarks.bench_auth_cache [--requests 5000] [--users 200]
+
+Tokens are real RS256 JWTs signed with a throwaway key, and
+firebase_admin.auth.verify_id_token is replaced with google-auth's
+signature + claims check against the matching certificate, so the
+uncached path pays a genuine RSA verification (but no network fetch).
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import time
+
+import firebase_admin
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi.security import HTTPAuthorizationCredentials
+from google.auth import crypt, jwt
+
+from utils import firebase_auth
+from utils.token_cache import TokenCache
+
+PROJECT_ID = "blood-buddy-bench"
+
+
+def make_signer_and_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signer = crypt.RSASigner.from_string(pem_key, key_id="bench")
+    return signer, {"bench": cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+
+def make_token(signer, uid: str) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "uid": uid,
+        "iat": now,
+        "exp": now + 3600,
+        "email": f"{uid}@example.com",
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+async def run(tokens, requests: int):
+    latencies = []
+    for _ in range(requests):
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=random.choice(tokens))
+        started = time.perf_counter()
+        await firebase_auth.verify_firebase_token(credentials)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200, help="Distinct tokens in rotation")
+    args = parser.parse_args()
+
+    signer, certs = make_signer_and_cert()
+    tokens = [make_token(signer, f"user-{i}") for i in range(args.users)]
+
+    firebase_admin.get_app = lambda name=None: object()
+    firebase_auth.auth.verify_id_token = lambda token: jwt.decode(token, certs=certs, audience=PROJECT_ID)
+
+    print(f"{args.requests} requests over {args.users} distinct tokens")
+    print(f"{'cache':>8} {'total (s)':>10} {'p50 us':>9} {'p99 us':>9} {'hit rate':>9}")
+    for label, size in (("off", 0), ("on", 10000)):
+        firebase_auth.token_cache = TokenCache(max_entries=size)
+        started = time.perf_counter()
+        latencies = asyncio.run(run(tokens, args.requests))
+        elapsed = time.perf_counter() - started
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e6
+        print(
+            f"{label:>8} {elapsed:>10.2f} {p50:>9.1f} {p99:>9.1f} "
+            f"{firebase_auth.token_cache.stats()['hit_rate']:>9.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: per-donor geodesic loop vs. vectorized batch distances
+
+    cd Backend
+    python -m benchmarks.bench_distance
+
+The geodesic loop is only timed on a sample (it is far too slow at 1M donors)
+and reported as donors/second so the numbers are comparable.
+"""
+
+import time
+import numpy as np
+from utils.geo_utils import calculate_distance, batch_distances
+
+ORIGIN = (19.0760, 72.8777)  # Mumbai
+SIZES = [10_000, 100_000, 1_000_000]
+LOOP_SAMPLE = 10_000
+REFINE_TOP_K = 50
+
+
+def random_donors(count: int, seed: int = 42):
+    """Donors scattered within roughly +/-5 degrees of the origin"""
+    rng = np.random.default_rng(seed)
+    lats = ORIGIN[0] + rng.uniform(-5, 5, count)
+    lons = ORIGIN[1] + rng.uniform(-5, 5, count)
+    return lats, lons
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    """Fastest wall-clock time of `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    lats, lons = random_donors(LOOP_SAMPLE)
+    loop_time = best_of(
+        lambda: [calculate_distance(*ORIGIN, lat, lon) for lat, lon in zip(lats, lons)],
+        repeat=1,
+    )
+    loop_rate = LOOP_SAMPLE / loop_time
+    print(f"{'donors':>10} {'method':<24} {'time (ms)':>10} {'donors/s':>14}")
+    print(f"{LOOP_SAMPLE:>10} {'geodesic loop':<24} {loop_time * 1000:>10.1f} {loop_rate:>14,.0f}")
+
+    for size in SIZES:
+        lats, lons = random_donors(size)
+        for label, top_k in (("haversine batch", None), (f"batch + refine top {REFINE_TOP_K}", REFINE_TOP_K)):
+            elapsed = best_of(lambda: batch_distances(*ORIGIN, lats, lons, refine_top_k=top_k))
+            print(f"{size:>10} {label:<24} {elapsed * 1000:>10.1f} {size / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
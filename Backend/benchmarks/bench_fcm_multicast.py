@@ -0,0 +1,66 @@
+"""
+Benchmark: chunked, concurrent FCM multicast against a local mock of the messaging API
+
+    cd Backend
+    python -m benchmarks.bench_fcm_multicast [--tokens 10000] [--latency-ms 120]
+
+The mock replaces firebase_admin.messaging.send_each_for_multicast with a
+function that sleeps for a fixed round-trip plus a small per-token cost,
+rejects batches over 500 tokens (as FCM does) and marks ~1% of tokens as
+unregistered (pruning is stubbed out). No network access, MongoDB or
+Firebase project is needed.
+"""
+
+import argparse
+import time
+from firebase_admin import messaging
+
+from utils.notification_service import FirebaseNotificationService, FCM_MULTICAST_LIMIT
+
+
+def make_mock_send(latency_s: float, per_token_s: float):
+    def mock_send_each_for_multicast(message, dry_run=False, app=None):
+        if len(message.tokens) > FCM_MULTICAST_LIMIT:
+            raise ValueError("tokens must not contain more than 500 tokens")
+        time.sleep(latency_s + per_token_s * len(message.tokens))
+        responses = []
+        for token in message.tokens:
+            if token.endswith("99"):
+                error = messaging.UnregisteredError("Requested entity was not found.")
+                responses.append(messaging.SendResponse(None, error))
+            else:
+                responses.append(messaging.SendResponse({"name": f"projects/mock/messages/{token}"}, None))
+        return messaging.BatchResponse(responses)
+    return mock_send_each_for_multicast
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--latency-ms", type=float, default=120.0, help="Mock round-trip per batch")
+    parser.add_argument("--per-token-us", type=float, default=50.0, help="Mock cost per token")
+    args = parser.parse_args()
+
+    messaging.send_each_for_multicast = make_mock_send(args.latency_ms / 1000, args.per_token_us / 1e6)
+    tokens = [f"token-{i:06d}" for i in range(args.tokens)]
+
+    service = FirebaseNotificationService()
+    service.enabled = True
+    # Count dead tokens instead of writing to MongoDB
+    service.prune_dead_tokens = lambda dead_tokens: len(dead_tokens)
+
+    print(f"{args.tokens} tokens, {args.latency_ms:.0f} ms mock round-trip per batch")
+    print(f"{'parallel batches':>16} {'time (s)':>9} {'tokens/s':>10} {'ok':>7} {'failed':>7}")
+    for parallel in (1, 2, 4, 8, 16):
+        service.max_parallel_batches = parallel
+        started = time.perf_counter()
+        result = service.send_multicast(tokens, "Benchmark", "Benchmark body")
+        elapsed = time.perf_counter() - started
+        print(
+            f"{parallel:>16} {elapsed:>9.2f} {args.tokens / elapsed:>10,.0f} "
+            f"{result['success_count']:>7} {result['failure_count']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
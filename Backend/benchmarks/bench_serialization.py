@@ -0,0 +1,104 @@
+"""
+Benchmark: bytes on the wire and serialization time of /donors/nearby pages
+
+Compares, per 1,000 donors, the full donor documents the endpoint used to
+return (FastAPI's default jsonable_encoder + json path) with the projected
+DonorSummary fields, serialized through the response model or by orjson
+straight from the decoded BSON dicts (what the endpoint does now). The
+BSON decode of each shape is timed too, since the projection also shrinks
+what MongoDB sends and pymongo decodes. No MongoDB is needed:
+
+    cd Backend
+    python -m benchmarks.bench_serialization [--donors 1000] [--repeat 50]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+import bson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.suite import synthetic_donors
+from models.donor_model import NearbyDonorsPage, DONOR_SUMMARY_PROJECTION
+from utils.json_response import OrjsonResponse
+
+
+def page_documents(count: int, projected: bool) -> List[dict]:
+    """Donor documents as $geoNear returns them, with or without the summary projection"""
+    donors = []
+    for i, donor in enumerate(synthetic_donors(count)):
+        donor["_id"] = bson.ObjectId()
+        donor["distance_km"] = round(i * 0.01, 2)
+        donor["topics"] = ["blood-type-o-positive", "region-109-252"]
+        if projected:
+            donor = {field: donor[field] for field in ("_id", *DONOR_SUMMARY_PROJECTION, "distance_km")}
+        donors.append(donor)
+    return donors
+
+
+def time_ms(fn: Callable[[], object], repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--donors", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    full = page_documents(args.donors, projected=False)
+    slim = page_documents(args.donors, projected=True)
+    full_bson = [bson.encode(d) for d in full]
+    slim_bson = [bson.encode(d) for d in slim]
+
+    def strip(donors):
+        # The endpoint drops _id (and used to drop geo/eligible_from/topics) before responding
+        return [{k: v for k, v in d.items() if k not in ("_id", "geo", "eligible_from", "topics")} for d in donors]
+
+    full_page = {"count": len(full), "donors": strip(full), "next_cursor": "x" * 80}
+    slim_page = {"count": len(slim), "donors": strip(slim), "next_cursor": "x" * 80}
+
+    variants: Dict[str, Dict[str, Callable[[], object]]] = {
+        "full_documents_default_json": {
+            "decode": lambda: [bson.decode(b) for b in full_bson],
+            "serialize": lambda: JSONResponse(jsonable_encoder(full_page)).body,
+        },
+        "summary_response_model": {
+            "decode": lambda: [bson.decode(b) for b in slim_bson],
+            "serialize": lambda: NearbyDonorsPage.model_validate(slim_page).model_dump_json().encode(),
+        },
+        "summary_orjson": {
+            "decode": lambda: [bson.decode(b) for b in slim_bson],
+            "serialize": lambda: OrjsonResponse(slim_page).body,
+        },
+    }
+
+    scale = 1000 / args.donors
+    report = {"donors": args.donors, "repeat": args.repeat, "per_1000_donors": {}}
+    for name, steps in variants.items():
+        body = steps["serialize"]()
+        decode_ms = time_ms(steps["decode"], args.repeat)
+        serialize_ms = time_ms(steps["serialize"], args.repeat)
+        report["per_1000_donors"][name] = {
+            "bytes": round(len(body) * scale),
+            "bson_decode_ms": round(decode_ms * scale, 3),
+            "serialize_ms": round(serialize_ms * scale, 3),
+        }
+        # Every variant must produce the same donors it claims to
+        assert json.loads(body)["count"] == args.donors
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: sequential vs. concurrent bulk SMS against a local fake Twilio endpoint
+
+    cd Backend
+    python -m benchmarks.bench_sms_bulk [--recipients 500] [--latency-ms 150]
+
+A threaded HTTP server on 127.0.0.1 answers the Twilio Messages API with a
+fixed delay and returns HTTP 429 for ~2% of first attempts, so retries are
+exercised too. The Twilio client is pointed at it; nothing leaves the machine.
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from twilio.rest import Client
+
+from utils.rate_limiter import TokenBucket
+from utils.sms_service import SMSService
+
+
+class FakeTwilioHandler(BaseHTTPRequestHandler):
+    latency_s = 0.15
+    seen = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode()
+        time.sleep(self.latency_s)
+
+        with self.lock:
+            first_attempt = body not in self.seen
+            self.seen.add(body)
+
+        if first_attempt and random.random() < 0.02:
+            payload, status = {"code": 20429, "message": "Too Many Requests", "status": 429}, 429
+        else:
+            payload, status = {"sid": f"SM{random.getrandbits(64):016x}", "status": "queued"}, 201
+
+        encoded = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--mps", type=float, default=100.0, help="Account messages-per-second limit")
+    args = parser.parse_args()
+    logging.getLogger("utils.sms_service").setLevel(logging.ERROR)
+
+    FakeTwilioHandler.latency_s = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTwilioHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    service = SMSService()
+    service.account_sid, service.auth_token, service.phone_number = "AC" + "0" * 32, "token", "+10000000000"
+    service.client = Client(service.account_sid, service.auth_token)
+    service.client.api.base_url = f"http://127.0.0.1:{server.server_port}"
+    service.enabled = True
+    service.retry_backoff = 0.05
+
+    recipients = [f"+1555{i:07d}" for i in range(args.recipients)]
+    print(f"{args.recipients} recipients, {args.latency_ms:.0f} ms fake Twilio latency, {args.mps:.0f} msg/s limit")
+    print(f"{'threads':>8} {'time (s)':>9} {'msg/s':>8} {'ok':>6} {'failed':>7}")
+    for threads in (1, 8, 32):
+        FakeTwilioHandler.seen = set()
+        service.bulk_concurrency = threads
+        service.rate_limiter = TokenBucket(args.mps)
+        started = time.perf_counter()
+        result = service.send_bulk_sms(recipients, "Benchmark message")
+        elapsed = time.perf_counter() - started
+        print(
+            f"{threads:>8} {elapsed:>9.2f} {args.recipients / elapsed:>8.1f} "
+            f"{result['successful']:>6} {result['failed']:>7}"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
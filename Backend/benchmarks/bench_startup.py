@@ -0,0 +1,143 @@
+"""
+Benchmark: application import time and time to first response
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and
+reports the median import time, the slowest top-level packages, and
+whether any module meant to load lazily (Firebase, Twilio, geopy) was
+imported anyway. With --serve it also starts uvicorn and measures the
+time until `/` answers. No MongoDB or Firebase project is needed:
+
+    cd Backend
+    python -m benchmarks.bench_startup [--runs 5] [--max-ms 1500] [--serve]
+
+Exits with status 1 if a lazy module is imported eagerly or the median
+import time exceeds --max-ms, so it can guard startup time in CI.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy SDKs that must only be imported on first use
+LAZY_MODULES = ("firebase_admin", "twilio.rest", "geopy", "aiohttp")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure_imports() -> Tuple[float, Dict[str, float], List[str]]:
+    """
+    Import main in a fresh interpreter
+
+    Returns:
+        (total ms, ms per package imported by another package, every imported module name)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative_us, indent, name = match.groups()
+            entries.append(((len(indent) - 1) // 2, name, int(cumulative_us)))
+
+    # -X importtime prints children before their parent; walking the lines in
+    # reverse visits each parent first, so the enclosing package is known.
+    # A package's time is counted where it is entered from a different package.
+    packages: Dict[str, float] = defaultdict(float)
+    enclosing: List[str] = []
+    total_us = 0
+    for level, name, cumulative_us in reversed(entries):
+        package = name.split(".")[0]
+        del enclosing[level:]
+        if level > 0 and enclosing and enclosing[-1] != package:
+            packages[package] += cumulative_us / 1000
+        enclosing.append(package)
+        if name == "main":
+            total_us = cumulative_us
+    modules = [name for _, name, _ in entries]
+    return total_us / 1000, packages, modules
+    return total_us / 1000, packages, modules
+
+
+def time_to_first_response(port: int, timeout: float = 60.0) -> float:
+    """Seconds from spawning uvicorn until GET / returns 200"""
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                time.sleep(0.02)
+        raise RuntimeError(f"Server did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Without MongoDB, shutdown waits out pymongo's server selection timeout
+            server.kill()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median import exceeds this")
+    parser.add_argument("--serve", action="store_true", help="Also measure time to first HTTP response")
+    parser.add_argument("--port", type=int, default=8199)
+    args = parser.parse_args()
+
+    totals, package_runs, eager = [], defaultdict(list), set()
+    for _ in range(args.runs):
+        total_ms, packages, modules = measure_imports()
+        totals.append(total_ms)
+        for name, ms in packages.items():
+            package_runs[name].append(ms)
+        eager |= {m for m in modules for lazy in LAZY_MODULES if m == lazy or m.startswith(lazy + ".")}
+
+    slowest = sorted(
+        ((name, statistics.median(ms)) for name, ms in package_runs.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+    report = {
+        "runs": args.runs,
+        "import_main_ms": {
+            "median": round(statistics.median(totals), 1),
+            "min": round(min(totals), 1),
+            "max": round(max(totals), 1),
+        },
+        "slowest_packages_ms": {name: round(ms, 1) for name, ms in slowest},
+        "eager_lazy_modules": sorted({m.split(".")[0] if m != "twilio.rest" else m for m in eager}),
+    }
+    if args.serve:
+        report["first_response_seconds"] = round(time_to_first_response(args.port), 3)
+
+    print(json.dumps(report, indent=2))
+
+    failed = bool(report["eager_lazy_modules"])
+    if args.max_ms is not None and report["import_main_ms"]["median"] > args.max_ms:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
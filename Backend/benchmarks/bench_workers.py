@@ -0,0 +1,141 @@
+"""
+Benchmark: throughput scaling with the number of gunicorn workers
+
+Starts `gunicorn main:app -c gunicorn.conf.py` with 1, 2, 4, ... workers
+against a seeded scratch database and drives one endpoint from several
+load-generator processes (a single Python client would saturate before
+the server does). Reports req/s per worker count and scaling efficiency
+(req/s divided by workers x the 1-worker req/s) as JSON:
+
+    cd Backend
+    python -m benchmarks.bench_workers --seed 100000 --workers 1,2,4 --duration 15
+
+Scaling is only linear while there are at least as many free cores as
+workers plus load generators and MongoDB is not the bottleneck; run the
+load generators on another machine (--base-host) for a clean measurement.
+The nearby result cache and blood request coalescing are switched off so
+every request does real work.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_ready(base_url: str, timeout: float = 60.0):
+    """Poll / until the server answers (startup includes index creation)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout:.0f}s")
+
+
+def _client_process(args) -> Dict:
+    base_url, scenario, concurrency, duration, token = args
+    from benchmarks.load_test import run
+
+    return asyncio.run(run(base_url, [scenario], concurrency, duration, token=token))[scenario]
+
+
+def drive(base_url: str, scenario: str, clients: int, concurrency: int, duration: float, token=None) -> Dict:
+    """Run `clients` load-generator processes in parallel and combine their stats"""
+    with multiprocessing.get_context("spawn").Pool(clients) as pool:
+        results = pool.map(_client_process, [(base_url, scenario, concurrency, duration, token)] * clients)
+    return {
+        "requests": sum(r["requests"] for r in results),
+        "errors": sum(r["errors"] for r in results),
+        "rps": round(sum(r["rps"] for r in results), 1),
+        # Percentiles of separate clients cannot be merged exactly; report the worst client
+        "p50_ms": max(r["p50_ms"] for r in results),
+        "p95_ms": max(r["p95_ms"] for r in results),
+        "p99_ms": max(r["p99_ms"] for r in results),
+    }
+
+
+def run_workers(count: int, args, env: Dict[str, str]) -> Dict:
+    """Start gunicorn with `count` workers, load it, then stop it"""
+    base_url = f"http://{args.base_host}:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+         "--workers", str(count), "--bind", f"0.0.0.0:{args.port}", "--access-logfile", "/dev/null"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        wait_until_ready(base_url)
+        time.sleep(args.warmup)
+        return drive(base_url, args.scenario, args.clients, args.concurrency, args.duration, args.token)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--scenario", default="nearby", help="load_test scenario to drive")
+    parser.add_argument(
+        "--token", default=os.getenv("LOAD_TEST_TOKEN"),
+        help="Firebase ID token for the request scenario (default: LOAD_TEST_TOKEN)"
+    )
+    parser.add_argument("--clients", type=int, default=4, help="Load-generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent requests per client")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds between readiness and load")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--base-host", default="127.0.0.1")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="blood_buddy_bench")
+    parser.add_argument("--seed", type=int, default=0, help="Re-seed the scratch database with this many donors")
+    args = parser.parse_args()
+
+    if args.db == "blood_buddy":
+        sys.exit("Refusing to use the production database name; pick another --db")
+    if args.scenario == "request" and not args.token:
+        parser.error("the request scenario needs a Firebase ID token: pass --token or set LOAD_TEST_TOKEN")
+
+    env = {
+        **os.environ,
+        "MONGODB_URI": args.mongo_uri,
+        "MONGO_DB_NAME": args.db,
+        "NEARBY_CACHE_BACKEND": "off",
+        "REQUEST_COALESCE_WINDOW": "0",
+        "DONOR_INDEX_WARMUP_JITTER": "0",
+    }
+    if args.seed:
+        os.environ.update(MONGODB_URI=args.mongo_uri, MONGO_DB_NAME=args.db)
+        from benchmarks.suite import seed_database
+
+        print(f"Seeding {args.seed} donors...", file=sys.stderr)
+        seed_database(args.seed)
+
+    results: List[Dict] = []
+    for count in (int(w) for w in args.workers.split(",")):
+        print(f"Running {args.scenario} against {count} worker(s)...", file=sys.stderr)
+        results.append({"workers": count, **run_workers(count, args, env)})
+
+    baseline = results[0]["rps"] / results[0]["workers"] if results and results[0]["rps"] else 0
+    for result in results:
+        result["efficiency"] = round(result["rps"] / (result["workers"] * baseline), 2) if baseline else None
+
+    print(json.dumps({"scenario": args.scenario, "cpu_count": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
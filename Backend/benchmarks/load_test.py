@@ -0,0 +1,181 @@
+"""
+HTTP load test for the donor API
+
+Fires requests at a running server with a fixed number of concurrent
+clients and reports requests/sec plus p50/p99 latency per endpoint.
+To compare two builds (e.g. the old sync routes vs. the async ones),
+start each on its own port against the same database and run:
+
+    cd Backend
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --concurrency 64 --duration 20
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8001 --concurrency 64 --duration 20
+
+The blood request scenario needs a real Firebase ID token (--token or
+LOAD_TEST_TOKEN). Any non-2xx response counts as an error and is listed
+by status code. Pass --json to get machine-readable output.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+BLOOD_GROUPS = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
+CITY_CENTERS = [(19.0760, 72.8777), (28.6139, 77.2090), (12.9716, 77.5946), (22.5726, 88.3639)]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `samples` (pct in 0..100)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def random_point():
+    lat, lon = random.choice(CITY_CENTERS)
+    return lat + random.uniform(-0.2, 0.2), lon + random.uniform(-0.2, 0.2)
+
+
+def nearby_request():
+    lat, lon = random_point()
+    return "GET", "/donors/nearby", {
+        "params": {"lat": lat, "lon": lon, "blood_group": random.choice(BLOOD_GROUPS), "limit": 20}
+    }
+
+
+def blood_request():
+    lat, lon = random_point()
+    return "POST", "/donors/request", {
+        "params": {
+            "blood_group": random.choice(BLOOD_GROUPS),
+            "location": "Load test hospital",
+            "latitude": lat,
+            "longitude": lon,
+        },
+    }
+
+
+def add_request():
+    lat, lon = random_point()
+    return "POST", "/donors/add", {
+        "json": {
+            "name": "Load Test Donor",
+            "blood_group": random.choice(BLOOD_GROUPS),
+            "city": "Load Test City",
+            "contact": "+10000000000",
+            "latitude": lat,
+            "longitude": lon,
+        }
+    }
+
+
+SCENARIOS = {
+    "nearby": nearby_request,
+    "request": blood_request,
+    "add": add_request,
+}
+
+
+async def run_scenario(client: httpx.AsyncClient, build, concurrency: int, duration: float) -> Dict:
+    """Run one endpoint with `concurrency` clients for `duration` seconds"""
+    latencies: List[float] = []
+    errors = 0
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, kwargs = build()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                statuses[response.status_code] += 1
+                # A fast 401 or 422 is not a served request
+                if not 200 <= response.status_code < 300:
+                    errors += 1
+            except httpx.HTTPError:
+                statuses["transport_error"] += 1
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run(
+    base_url: str,
+    scenarios: List[str],
+    concurrency: int,
+    duration: float,
+    transport=None,
+    token: Optional[str] = None
+) -> Dict:
+    """
+    Run every scenario in turn and return {scenario: stats}
+
+    `token` is sent as the bearer token; in-process runs (suite.py) override the auth dependency instead.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30, transport=transport, headers=headers
+    ) as client:
+        return {
+            name: await run_scenario(client, SCENARIOS[name], concurrency, duration)
+            for name in scenarios
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default="nearby,request", help=f"Comma-separated: {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument(
+        "--token", default=os.getenv("LOAD_TEST_TOKEN"),
+        help="Firebase ID token for the request scenario (default: LOAD_TEST_TOKEN)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    if "request" in scenarios and not args.token:
+        parser.error("the request scenario needs a Firebase ID token: pass --token or set LOAD_TEST_TOKEN")
+
+    results = asyncio.run(run(args.base_url, scenarios, args.concurrency, args.duration, token=args.token))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, stats in results.items():
+        print(
+            f"{name:<10} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9} "
+            f"{stats['p50_ms']:>9} {stats['p99_ms']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Reproducible benchmark suite for the donor API
+
+Seeds a scratch database on a local MongoDB with synthetic donors
+clustered around Indian cities, then drives /donors/nearby,
+/donors/request and /donors/add in-process (httpx ASGI transport) at a
+fixed concurrency. Firebase auth, FCM and Twilio are stubbed locally, so
+nothing leaves the machine:
+
+    cd Backend
+    python -m benchmarks.suite --scales 10000,100000,1000000 --concurrency 32 --duration 10 --output bench.json
+
+A local `mongod` is required: the routes rely on $geoNear and 2dsphere
+indexes, which in-memory stand-ins such as mongomock do not implement.
+The scratch database (--db, default blood_buddy_bench) is dropped and
+re-seeded for every scale. Results are JSON: per scale, seeding and index
+load time plus throughput and p50/p95/p99 latency per scenario.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+# (lat, lon, share of donors) - the load_test city centres carry most of the traffic
+CITIES = [
+    (19.0760, 72.8777, 0.22),  # Mumbai
+    (28.6139, 77.2090, 0.22),  # Delhi
+    (12.9716, 77.5946, 0.16),  # Bengaluru
+    (22.5726, 88.3639, 0.12),  # Kolkata
+    (13.0827, 80.2707, 0.10),  # Chennai
+    (17.3850, 78.4867, 0.08),  # Hyderabad
+    (18.5204, 73.8567, 0.06),  # Pune
+    (23.0225, 72.5714, 0.04),  # Ahmedabad
+]
+
+# Approximate ABO/Rh distribution of the donor population
+BLOOD_GROUP_SHARES = {
+    "O+": 0.37, "B+": 0.32, "A+": 0.22, "AB+": 0.07,
+    "O-": 0.008, "B-": 0.006, "A-": 0.004, "AB-": 0.002,
+}
+
+SEED_BATCH_SIZE = 10_000
+
+
+def synthetic_donors(count: int, seed: int = 42):
+    """
+    Yield donor documents clustered around CITIES
+
+    Each city is a Gaussian blob (~10 km sigma) so density, and therefore
+    query cost, varies the way it does in production. About 70% of donors
+    have an FCM token and ~5% donated within the last 56 days (ineligible).
+    """
+    from utils.geo_utils import to_geojson_point
+    from utils.eligibility import eligible_from
+
+    rng = random.Random(seed)
+    city_weights = [share for _, _, share in CITIES]
+    groups, group_weights = zip(*BLOOD_GROUP_SHARES.items())
+    now = datetime.now(timezone.utc)
+
+    for i in range(count):
+        city_lat, city_lon, _ = rng.choices(CITIES, city_weights)[0]
+        lat = city_lat + rng.gauss(0, 0.09)
+        lon = city_lon + rng.gauss(0, 0.09)
+        last_donated = now - timedelta(days=rng.randint(1, 400)) if rng.random() < 0.4 else None
+        yield {
+            "name": f"Bench Donor {i}",
+            "blood_group": rng.choices(groups, group_weights)[0],
+            "city": "Bench City",
+            "contact": f"+91{9000000000 + i}",
+            "latitude": lat,
+            "longitude": lon,
+            "last_donated": last_donated,
+            "fcm_token": f"bench-token-{i}" if rng.random() < 0.7 else None,
+            "geo": to_geojson_point(lat, lon),
+            "eligible_from": eligible_from(last_donated),
+        }
+
+
+def seed_database(count: int) -> float:
+    """Drop the scratch collections and insert `count` donors; returns seconds taken"""
+    from database.connection import sync_db, sync_donor_collection, DONOR_VERSION_ID
+
+    for name in ("donors", "blood_requests", "notification_outbox", "request_coalescing", "meta"):
+        sync_db.drop_collection(name)
+
+    started = time.perf_counter()
+    batch = []
+    for donor in synthetic_donors(count):
+        batch.append(donor)
+        if len(batch) >= SEED_BATCH_SIZE:
+            sync_donor_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        sync_donor_collection.insert_many(batch, ordered=False)
+    sync_db["meta"].update_one({"_id": DONOR_VERSION_ID}, {"$set": {"version": 1}}, upsert=True)
+    return time.perf_counter() - started
+
+
+class _FakeTwilioMessages:
+    """Stands in for twilio Client.messages with a fixed round-trip"""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    def create(self, body: str, from_: str, to: str):
+        time.sleep(self.latency_s)
+        return type("Message", (), {"sid": f"SM{abs(hash(to))}", "status": "queued"})()
+
+
+def install_stubs(fcm_latency_s: float, sms_latency_s: float):
+    """Replace Firebase auth, FCM and Twilio with local fakes"""
+    from firebase_admin import messaging
+    from benchmarks.bench_fcm_multicast import make_mock_send
+    from utils.notification_service import fcm_service
+    from utils.sms_service import sms_service
+    from utils.rate_limiter import TokenBucket
+    from utils.firebase_auth import verify_firebase_token
+    import main
+
+    def mock_send(message, dry_run=False, app=None):
+        time.sleep(fcm_latency_s)
+        return f"projects/mock/messages/{message.token}"
+
+    messaging.send_each_for_multicast = make_mock_send(fcm_latency_s, 0.0)
+    messaging.send = mock_send
+    fcm_service.enabled = True
+
+    sms_service.client = type("Client", (), {"messages": _FakeTwilioMessages(sms_latency_s)})()
+    sms_service.phone_number = "+10000000000"
+    sms_service.rate_limiter = TokenBucket(10_000)
+    sms_service.enabled = True
+
+    main.app.dependency_overrides[verify_firebase_token] = lambda: {"uid": "bench", "name": "Bench Hospital"}
+
+
+async def run_scale(count: int, scenarios: List[str], concurrency: int, duration: float) -> Dict:
+    """Seed `count` donors and run every scenario against the in-process app"""
+    import httpx
+    import main
+    from benchmarks.load_test import run
+    from database.connection import ensure_indexes, sync_donor_collection, read_donor_state
+    from utils.donor_index import donor_index
+    from utils.notification_dispatcher import notification_dispatcher
+    from utils.notification_outbox import notification_outbox
+    from utils.result_cache import nearby_cache
+
+    seed_seconds = seed_database(count)
+    await ensure_indexes()
+
+    started = time.perf_counter()
+    donor_index.load(sync_donor_collection, read_donor_state())
+    index_seconds = time.perf_counter() - started
+    await nearby_cache.clear()
+
+    await notification_dispatcher.start()
+    await notification_outbox.start()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        results = await run("http://bench", scenarios, concurrency, duration, transport=transport)
+    finally:
+        await notification_outbox.stop()
+        await notification_dispatcher.stop()
+
+    return {
+        "donors": count,
+        "seed_seconds": round(seed_seconds, 2),
+        "index_load_seconds": round(index_seconds, 2),
+        "index_ready": donor_index.ready,
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="blood_buddy_bench", help="Scratch database (dropped on every run)")
+    parser.add_argument("--scales", default="10000,100000,1000000", help="Comma-separated donor counts")
+    parser.add_argument("--scenarios", default="nearby,request,add")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--fcm-latency-ms", type=float, default=50.0, help="Stubbed FCM round-trip")
+    parser.add_argument("--sms-latency-ms", type=float, default=100.0, help="Stubbed Twilio round-trip")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.db == "blood_buddy":
+        sys.exit("Refusing to seed the production database name; pick another --db")
+
+    # Must be set before the app modules create their MongoDB clients
+    os.environ["MONGODB_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = args.db
+    install_stubs(args.fcm_latency_ms / 1000, args.sms_latency_ms / 1000)
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "results": [],
+    }
+
+    async def run_all():
+        # One event loop for every scale: the async MongoDB client is bound to it
+        for scale in (int(s) for s in args.scales.split(",")):
+            print(f"Seeding {scale} donors and running {args.scenarios}...", file=sys.stderr)
+            report["results"].append(
+                await run_scale(scale, args.scenarios.split(","), args.concurrency, args.duration)
+            )
+
+    asyncio.run(run_all())
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
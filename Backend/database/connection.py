@@ -1,16 +1,106 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient, ASCENDING, GEOSPHERE, ReturnDocument
+from pymongo.errors import OperationFailure
 import os
+from typing import Tuple
 from dotenv import load_dotenv
 
 # Load variables from .env file
 load_dotenv()
 
 # Get MongoDB URI from environment or default to local
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "blood_buddy")
 
-# Connect to MongoDB
-client = MongoClient(MONGO_URI)
+# Connection pool sizing (see .env.example)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Connect to MongoDB (async client used by the API routes)
+client = AsyncMongoClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+)
 
 # Use your database and collection
-db = client["blood_buddy"]
+db = client[MONGO_DB_NAME]
 donor_collection = db["donors"]
+
+# Blood requests (keyed by idempotency key) and their pending notification batches
+blood_request_collection = db["blood_requests"]
+outbox_collection = db["notification_outbox"]
+# Leader claims of coalesced duplicate blood requests (one per key, expiring with its window)
+coalesce_collection = db["request_coalescing"]
+
+# Bookkeeping documents (e.g. the donor collection version counter)
+meta_collection = db["meta"]
+DONOR_VERSION_ID = "donors"
+
+# Neither client opens a connection until its first operation, so importing this module stays cheap
+
+# Small blocking client for migrations and background threads (e.g. the donor index loader)
+sync_client = MongoClient(MONGO_URI, maxPoolSize=4, connect=False)
+sync_db = sync_client[MONGO_DB_NAME]
+sync_donor_collection = sync_db["donors"]
+
+
+async def ensure_indexes():
+    """Create the indexes the donor queries rely on (no-op if they already exist)"""
+    # Compound 2dsphere index so $geoNear filters blood group and eligibility inside the index
+    await donor_collection.create_index(
+        [("geo", GEOSPHERE), ("blood_group", ASCENDING), ("eligible_from", ASCENDING)],
+        name="geo_blood_group_eligible",
+    )
+    # The plain geo index is superseded ($geoNear needs a single 2dsphere index to choose from)
+    try:
+        await donor_collection.drop_index("geo_2dsphere")
+    except OperationFailure:
+        pass
+
+    # One blood request per idempotency key; both collections expire after a week
+    await blood_request_collection.create_index("idempotency_key", unique=True, name="idempotency_key_unique")
+    await blood_request_collection.create_index("created_at", expireAfterSeconds=7 * 24 * 3600, name="created_at_ttl")
+    # Outbox workers claim the oldest pending/expired batch
+    await outbox_collection.create_index(
+        [("status", ASCENDING), ("lease_until", ASCENDING), ("created_at", ASCENDING)], name="claim"
+    )
+    await outbox_collection.create_index("request_id", name="request_id")
+    await outbox_collection.create_index("created_at", expireAfterSeconds=7 * 24 * 3600, name="created_at_ttl")
+    # Expired coalescing claims are taken over in place; the TTL only cleans up idle keys
+    await coalesce_collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+
+
+async def bump_donor_version(rebuild: bool = False) -> int:
+    """
+    Increment the donor collection version and return the new value
+
+    Args:
+        rebuild: Existing donors were modified, not just new ones inserted; in-memory
+            copies must be rebuilt instead of catching up on new donors
+    """
+    doc = await meta_collection.find_one_and_update(
+        {"_id": DONOR_VERSION_ID},
+        {"$inc": {"version": 1, "rebuild": 1 if rebuild else 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+def bump_donor_version_sync(rebuild: bool = False) -> int:
+    """bump_donor_version for blocking callers (migrations)"""
+    doc = sync_db["meta"].find_one_and_update(
+        {"_id": DONOR_VERSION_ID},
+        {"$inc": {"version": 1, "rebuild": 1 if rebuild else 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+def read_donor_state() -> Tuple[int, int]:
+    """Current donor collection (version, rebuild) counters (blocking; for background threads)"""
+    doc = sync_db["meta"].find_one({"_id": DONOR_VERSION_ID})
+    return (doc["version"], doc.get("rebuild", 0)) if doc else (0, 0)
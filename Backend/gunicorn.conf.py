@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for multi-worker production serving
+
+    cd Backend
+    gunicorn main:app -c gunicorn.conf.py
+
+Each worker is a separate process running uvicorn's event loop. The app is
+imported after the fork (preload_app stays off), so every worker builds its
+own MongoDB clients, Firebase app and Twilio client, and its own in-process
+caches (donor index, token cache, nearby cache) that warm lazily.
+
+Sizing: the API is async and I/O bound, so one worker per CPU core is the
+starting point (WEB_CONCURRENCY overrides it). Keep
+workers x MONGO_MAX_POOL_SIZE under the MongoDB connection limit and
+workers x DONOR_INDEX_MAX_DONORS within memory. Per-account limits that
+each worker enforces on its own (TWILIO_MESSAGES_PER_SECOND) are split
+evenly between the workers.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Workers read the final count to take their share of the Twilio rate limit
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app in each worker, never in the master: module-level clients must not cross a fork
+preload_app = False
+
+# Long enough for a blood request that waits on the outbox write under load
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to cap slow memory growth; jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+# Spread donor index warmups over a few seconds so N workers do not read the collection at once
+os.environ.setdefault("DONOR_INDEX_WARMUP_JITTER", str(min(2 * workers, 30)))
+
+# Prometheus multiprocess mode: workers write samples here and /metrics aggregates them
+_metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "blood-buddy-metrics")
+)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Start every deploy with an empty metrics directory
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
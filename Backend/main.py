@@ -1,7 +1,24 @@
-from fastapi import FastAPI
+import os
+import random
+import asyncio
+from fastapi import FastAPI, Response
 from routes.donor_routes import router as donor_router
+from routes.notification_routes import router as notification_router
+from routes.health_routes import router as health_router
 from fastapi.middleware.cors import CORSMiddleware
-from utils.firebase_auth import initialize_firebase
+from utils.firebase_auth import initialize_firebase, token_cache
+from utils.notification_service import fcm_service
+from database.connection import ensure_indexes, sync_donor_collection, read_donor_state
+from utils.donor_index import donor_index
+from utils.notification_dispatcher import notification_dispatcher
+from utils.notification_outbox import notification_outbox
+from utils.topics import topic_subscriber
+from utils.coalescing import request_coalescer
+from utils.result_cache import nearby_cache
+from utils.metrics import MetricsMiddleware, render_metrics
+from utils.compression import add_compression
+from utils.http_cache import donor_etags
+from utils.readiness import startup
 
 app = FastAPI(title="Blood Buddy API", version="1.0")
 
@@ -14,15 +31,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Firebase on startup
+# gzip (or brotli, when brotli-asgi is installed) for bodies above the threshold
+add_compression(
+    app,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1000")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+)
+
+# Per-route latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
+def _start_firebase():
+    initialize_firebase()
+    fcm_service.attach_app()
+
+# Initialize Firebase and database indexes on startup
 @app.on_event("startup")
 async def startup_event():
-    initialize_firebase()
+    # Runs once per worker process, after the fork: clients and the Firebase app are per worker.
+    # Slow steps run in the background so the port opens at once; /ready reports their progress
+    startup.run_in_background("firebase", lambda: asyncio.to_thread(_start_firebase), retry_interval=30.0)
+    startup.run_in_background("mongo_indexes", ensure_indexes, retry_interval=5.0)
+    # Warm the in-memory donor index without blocking startup (routes use MongoDB until it is ready).
+    # With many workers, jitter spreads the full-collection reads; "lazy" defers them to the first match
+    if os.getenv("DONOR_INDEX_WARMUP", "startup") == "startup":
+        jitter = float(os.getenv("DONOR_INDEX_WARMUP_JITTER", "0"))
+        donor_index.load_in_background(sync_donor_collection, read_donor_state, delay=random.uniform(0, jitter))
+    await notification_dispatcher.start()
+    await notification_outbox.start()
+    await topic_subscriber.start()
     print("Application started successfully!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await startup.stop()
+    await topic_subscriber.stop()
+    await notification_outbox.stop()
+    await notification_dispatcher.stop()
+
 # Register routes
 app.include_router(donor_router)
+app.include_router(notification_router)
+app.include_router(health_router)
 
 @app.get("/")
 def root():
     return {"message": "Welcome to Blood Buddy API"}
+
+@app.get("/auth/cache-stats")
+def auth_cache_stats():
+    return token_cache.stats()
+
+@app.get("/donors/nearby/cache-stats")
+def nearby_cache_stats():
+    return nearby_cache.stats()
+
+@app.get("/donors/nearby/etag-stats")
+def nearby_etag_stats():
+    return donor_etags.metrics
+
+@app.get("/donors/request/coalescing-stats")
+def request_coalescing_stats():
+    return request_coalescer.metrics
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,26 @@
+"""
+One-off data migrations, run from Backend with python -m migrations.<name>
+"""
+
+import asyncio
+
+from database.connection import bump_donor_version_sync
+
+
+def announce_donor_changes(rebuild: bool = True) -> int:
+    """
+    Tell running workers that a migration changed donor documents
+
+    Bumps the donor collection version, so /donors/nearby ETags change and
+    workers rebuild their donor index (rebuild=True) or just catch up on it
+    at their next staleness check. A shared (redis) nearby cache is cleared;
+    in-memory ones expire within NEARBY_CACHE_TTL.
+
+    Returns:
+        The new donor collection version
+    """
+    from utils.result_cache import nearby_cache
+
+    version = bump_donor_version_sync(rebuild=rebuild)
+    asyncio.run(nearby_cache.clear())
+    return version
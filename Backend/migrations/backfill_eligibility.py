@@ -0,0 +1,69 @@
+"""
+Parse 'last_donated' strings into dates and backfill 'eligible_from'
+
+Donors stored before eligibility filtering kept 'last_donated' as free-form
+text and have no 'eligible_from', so matching skips them. Run once after
+deploying (values that cannot be parsed are kept in 'last_donated_raw'):
+
+    cd Backend
+    python -m migrations.backfill_eligibility
+"""
+
+import asyncio
+from pymongo import UpdateOne
+from database.connection import sync_donor_collection as donor_collection, ensure_indexes
+from migrations import announce_donor_changes
+from utils.eligibility import parse_donation_date, eligible_from
+
+BATCH_SIZE = 1000
+
+
+def backfill_eligibility(batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Convert 'last_donated' to a date and set 'eligible_from' on every donor missing it
+
+    Args:
+        batch_size: Number of updates sent per bulk_write
+
+    Returns:
+        {"updated": ..., "unparsed": ...} document counts
+    """
+    cursor = donor_collection.find(
+        {"$or": [{"eligible_from": {"$exists": False}}, {"last_donated": {"$type": "string"}}]},
+        {"last_donated": 1},
+    )
+
+    updated = 0
+    unparsed = 0
+    operations = []
+    for donor in cursor:
+        raw = donor.get("last_donated")
+        update = {}
+        try:
+            last_donated = parse_donation_date(raw)
+        except ValueError:
+            # Unknown format: treat as never donated but keep the original text
+            last_donated = None
+            update["last_donated_raw"] = raw
+            unparsed += 1
+        update["last_donated"] = last_donated
+        update["eligible_from"] = eligible_from(last_donated)
+
+        operations.append(UpdateOne({"_id": donor["_id"]}, {"$set": update}))
+        if len(operations) >= batch_size:
+            updated += donor_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+
+    if operations:
+        updated += donor_collection.bulk_write(operations, ordered=False).modified_count
+
+    return {"updated": updated, "unparsed": unparsed}
+
+
+if __name__ == "__main__":
+    counts = backfill_eligibility()
+    asyncio.run(ensure_indexes())
+    if counts["updated"]:
+        # Workers still hold the old eligible_from values in their donor index
+        announce_donor_changes()
+    print(f"Backfilled 'eligible_from' on {counts['updated']} donors ({counts['unparsed']} dates could not be parsed)")
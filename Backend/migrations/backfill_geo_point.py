@@ -0,0 +1,58 @@
+"""
+Backfill the GeoJSON 'geo' point on existing donor documents
+
+Donors inserted before the 2dsphere index existed only have 'latitude'/'longitude'.
+$geoNear ignores documents without a 'geo' field, so run this once after deploying:
+
+    cd Backend
+    python -m migrations.backfill_geo_point
+"""
+
+import asyncio
+from pymongo import UpdateOne
+from database.connection import sync_donor_collection as donor_collection, ensure_indexes
+from migrations import announce_donor_changes
+from utils.geo_utils import to_geojson_point
+
+BATCH_SIZE = 1000
+
+
+def backfill_geo_points(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Add 'geo' to every donor that has coordinates but no point yet
+
+    Args:
+        batch_size: Number of updates sent per bulk_write
+
+    Returns:
+        Number of donor documents updated
+    """
+    cursor = donor_collection.find(
+        {"geo": {"$exists": False}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+        {"latitude": 1, "longitude": 1},
+    )
+
+    updated = 0
+    operations = []
+    for donor in cursor:
+        operations.append(UpdateOne(
+            {"_id": donor["_id"]},
+            {"$set": {"geo": to_geojson_point(donor["latitude"], donor["longitude"])}},
+        ))
+        if len(operations) >= batch_size:
+            updated += donor_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+
+    if operations:
+        updated += donor_collection.bulk_write(operations, ordered=False).modified_count
+
+    return updated
+
+
+if __name__ == "__main__":
+    count = backfill_geo_points()
+    asyncio.run(ensure_indexes())
+    if count:
+        # Newly matchable donors: nearby pages and their ETags must change
+        announce_donor_changes()
+    print(f"Backfilled 'geo' on {count} donors")
@@ -0,0 +1,82 @@
+"""
+Subscribe existing donors to their blood group and region FCM topics
+
+Donors registered before topic subscriptions (or whose subscription was
+lost in a restart) are not reached by emergency broadcasts. Run once after
+deploying, and with --force after changing TOPIC_REGION_DEG:
+
+    cd Backend
+    python -m migrations.backfill_topic_subscriptions [--force]
+
+Tokens are grouped per topic and subscribed 1000 at a time; subscribed
+topics are recorded on each donor ('topics'), so the job can be re-run
+and subscribes each donor only to the topics still missing.
+"""
+
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+from database.connection import sync_donor_collection as donor_collection
+from utils.firebase_auth import initialize_firebase
+from utils.notification_service import fcm_service
+from utils.topics import FCM_SUBSCRIBE_LIMIT, donor_topics, subscribe_tokens
+
+
+def backfill_topic_subscriptions(force: bool = False) -> dict:
+    """
+    Subscribe every donor with an FCM token to those of its topics not yet recorded
+
+    Args:
+        force: Re-subscribe donors to every topic (e.g. after a region size change)
+
+    Returns:
+        {"donors": ..., "subscribed": ..., "failed": ..., "calls": ...}
+    """
+    query = {"fcm_token": {"$nin": [None, ""]}}
+    if force:
+        donor_collection.update_many(query, {"$unset": {"topics": ""}})
+
+    counts = {"donors": 0, "subscribed": 0, "failed": 0, "calls": 0}
+    pending: Dict[str, List[str]] = defaultdict(list)
+
+    def flush(topic: str):
+        subscribed, failed = subscribe_tokens(topic, pending.pop(topic))
+        counts["subscribed"] += subscribed
+        counts["failed"] += failed
+        counts["calls"] += 1
+
+    # Buffers hold at most 1000 tokens per topic, so memory stays bounded for any collection size
+    # A donor's topics depend on its document, so which are missing is decided here, not in the query
+    cursor = donor_collection.find(
+        query, {"fcm_token": 1, "blood_group": 1, "latitude": 1, "longitude": 1, "topics": 1}
+    )
+    for donor in cursor:
+        missing = [topic for topic in donor_topics(donor) if topic not in donor.get("topics", [])]
+        if not missing:
+            continue
+        counts["donors"] += 1
+        for topic in missing:
+            pending[topic].append(donor["fcm_token"])
+            if len(pending[topic]) >= FCM_SUBSCRIBE_LIMIT:
+                flush(topic)
+
+    for topic in list(pending):
+        flush(topic)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Subscribe existing donors to FCM topics")
+    parser.add_argument("--force", action="store_true", help="Re-subscribe donors that already have topics")
+    args = parser.parse_args()
+
+    initialize_firebase()
+    if not fcm_service.attach_app():
+        raise SystemExit("Firebase is not configured; set FIREBASE_CREDENTIALS or FIREBASE_CREDENTIALS_JSON")
+
+    counts = backfill_topic_subscriptions(force=args.force)
+    print(
+        f"Subscribed {counts['subscribed']} tokens of {counts['donors']} donors "
+        f"in {counts['calls']} calls ({counts['failed']} failed)"
+    )
@@ -1,5 +1,8 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
+from utils.geo_utils import to_geojson_point
+from utils.eligibility import parse_donation_date, eligible_from
 
 class Donor(BaseModel):
     name: str
@@ -8,5 +11,38 @@ class Donor(BaseModel):
     contact: str
     latitude: float = Field(..., description="Latitude of donor’s location")
     longitude: float = Field(..., description="Longitude of donor’s location")
-    last_donated: Optional[str] = None
+    last_donated: Optional[datetime] = Field(None, description="Date of last donation (ISO 8601 or DD/MM/YYYY)")
     fcm_token: Optional[str] = None  # Firebase Cloud Messaging token for push notifications
+
+    @field_validator("last_donated", mode="before")
+    @classmethod
+    def parse_last_donated(cls, value):
+        return parse_donation_date(value)
+
+    def to_document(self) -> dict:
+        """Build the MongoDB document, including the GeoJSON point and the eligibility date used by the indexes"""
+        document = self.dict()
+        document["geo"] = to_geojson_point(self.latitude, self.longitude)
+        document["eligible_from"] = eligible_from(self.last_donated)
+        return document
+
+
+class DonorSummary(BaseModel):
+    """Public view of a donor in search results (no FCM token or internal index fields)"""
+    name: str
+    blood_group: str
+    city: str
+    contact: str
+    latitude: float
+    longitude: float
+    distance_km: float = Field(..., description="Distance from the searched location")
+
+
+# MongoDB projection returning exactly the stored DonorSummary fields ($geoNear adds distance_km)
+DONOR_SUMMARY_PROJECTION = {field: 1 for field in DonorSummary.model_fields if field != "distance_km"}
+
+
+class NearbyDonorsPage(BaseModel):
+    count: int
+    donors: List[DonorSummary]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page")
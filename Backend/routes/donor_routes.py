@@ -1,90 +1,469 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from models.donor_model import Donor
-from database.connection import donor_collection
-from utils.geo_utils import calculate_distance
-from utils.notification_service import send_welcome_notification, send_donor_match_notification
+import os
+import time
+import asyncio
+import uuid
+import logging
+from functools import partial
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+import orjson
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from models.donor_model import Donor, NearbyDonorsPage, DONOR_SUMMARY_PROJECTION
+from utils.geo_utils import to_geojson_point, batch_distances
+from utils.json_response import OrjsonResponse
+from database.connection import (
+    donor_collection, sync_donor_collection, bump_donor_version, read_donor_state
+)
+from utils.donor_index import donor_index, ring_radius
+from utils.blood_compatibility import compatible_donor_groups, match_rank
+from utils.eligibility import eligible_query
+from utils.pagination import InvalidCursor, decode_cursor, after_cursor_stages, next_cursor
+from utils.result_cache import nearby_cache
+from utils.metrics import stage_timer, DONORS_SCANNED, DONORS_MATCHED
+from utils.notification_service import send_welcome_notification
+from utils.donor_import import DonorImport, iter_rows
+from utils.notification_dispatcher import notification_dispatcher, DispatchQueueFull
+from utils.notification_outbox import notification_outbox, CHANNEL_FCM, CHANNEL_SMS, CHANNEL_TOPIC
+from utils.topics import topic_subscriber, donor_topics, regions_within, build_conditions
+from utils.coalescing import request_coalescer
+from utils.donor_throttle import donor_throttle
+from utils.http_cache import donor_etags
 from utils.firebase_auth import verify_firebase_token
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Blood requests search rings of doubling radius from REQUEST_START_RADIUS_KM until
+# target_count donors are found or max_radius_km (default REQUEST_RADIUS_KM) is reached
+REQUEST_RADIUS_KM = 50
+REQUEST_START_RADIUS_KM = float(os.getenv("REQUEST_START_RADIUS_KM", "5"))
+REQUEST_MAX_RADIUS_KM = float(os.getenv("REQUEST_MAX_RADIUS_KM", "500"))
+REQUEST_TARGET_DONORS = int(os.getenv("REQUEST_TARGET_DONORS", "100"))
+
+# /donors/nearby returns pages of at most NEARBY_MAX_PAGE_SIZE donors and streams at most NEARBY_MAX_STREAM
+NEARBY_MAX_PAGE_SIZE = 100
+NEARBY_MAX_STREAM = 100_000
+
+
+def geo_near_stage(
+    lat: float,
+    lon: float,
+    query: dict = None,
+    max_distance_km: float = None,
+    min_distance_km: float = None
+) -> dict:
+    """
+    Build a $geoNear stage that sorts donors by distance from (lat, lon)
+
+    Distances are written to 'distance_km' (MongoDB reports meters, hence the multiplier).
+    """
+    stage = {
+        "near": to_geojson_point(lat, lon),
+        "distanceField": "distance_km",
+        "distanceMultiplier": 0.001,
+        "spherical": True,
+        "query": query or {},
+    }
+    if max_distance_km is not None:
+        stage["maxDistance"] = max_distance_km * 1000
+    if min_distance_km is not None:
+        # 1 m of slack for the km -> m round trip; callers filter the boundary exactly
+        stage["minDistance"] = max(0.0, min_distance_km * 1000 - 1)
+    return {"$geoNear": stage}
+
 # 🩸 Add new donor
 @router.post("/donors/add")
-def add_donor(donor: Donor):
-    donor_dict = donor.dict()
-    result = donor_collection.insert_one(donor_dict)
+async def add_donor(donor: Donor):
+    donor_dict = donor.to_document()
+    result = await donor_collection.insert_one(donor_dict)
+    version = await bump_donor_version()
+    donor_index.add(donor_dict, version)
+    donor_etags.note_version(version)
+    await nearby_cache.invalidate_donor(donor_dict["blood_group"], donor_dict["latitude"], donor_dict["longitude"])
     
-    # Send welcome notification via FCM
+    # Queue welcome notification via FCM (sent in the background)
     # Note: In a real app, we would get the FCM token from the frontend
     # For now, we assume it might be passed or we skip if not present
+    dispatch_job_id = None
     if "fcm_token" in donor_dict and donor_dict["fcm_token"]:
-        send_welcome_notification(
-            token=donor_dict["fcm_token"],
-            donor_name=donor_dict["name"],
-            blood_type=donor_dict["blood_group"]
-        )
-        
-    return {"message": "Donor added successfully", "id": str(result.inserted_id)}
+        try:
+            dispatch_job_id = await notification_dispatcher.submit(
+                "welcome",
+                [donor_dict["fcm_token"]],
+                partial(
+                    send_welcome_notification,
+                    token=donor_dict["fcm_token"],
+                    donor_name=donor_dict["name"],
+                    blood_type=donor_dict["blood_group"]
+                ),
+            )
+        except DispatchQueueFull as e:
+            # The donor is saved; a missed welcome message is not worth failing the request
+            logger.warning(f"Welcome notification skipped: {e}")
+        # Blood group and region topics for emergency broadcasts (subscribed in batches)
+        topic_subscriber.add(donor_dict["fcm_token"], donor_topics(donor_dict))
+
+    return {
+        "message": "Donor added successfully",
+        "id": str(result.inserted_id),
+        "dispatch_job_id": dispatch_job_id
+    }
+
+# 🩸 Bulk import donors (streamed CSV or NDJSON body)
+@router.post("/donors/bulk")
+async def bulk_import_donors(request: Request):
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if "csv" in content_type else "ndjson"
+
+    donor_import = DonorImport(donor_collection)
+    try:
+        async for row_number, row in iter_rows(request.stream(), fmt):
+            await donor_import.add(row_number, row)
+        summary = await donor_import.finish()
+    finally:
+        # Also after a failed import: the rows inserted before it are live.
+        # One version bump for the whole import; the grid index reloads in the background
+        if donor_import.inserted:
+            donor_etags.note_version(await bump_donor_version())
+            donor_index.load_in_background(sync_donor_collection, read_donor_state, only_if_stale=True)
+            await nearby_cache.clear()
+
+    return summary
 
 # 🩸 Request Blood (New Endpoint)
 @router.post("/donors/request")
-def request_blood(
+async def request_blood(
     blood_group: str,
     location: str,
     latitude: float,
     longitude: float,
+    compatible: bool = Query(False, description="Also match donors of compatible blood groups"),
+    notify_sms: bool = Query(False, description="Also text matched donors via SMS"),
+    emergency: bool = Query(False, description="Broadcast to blood group/region topics instead of per-donor tokens"),
+    target_count: int = Query(REQUEST_TARGET_DONORS, ge=1, description="Stop widening the search once this many donors are found"),
+    max_radius_km: float = Query(REQUEST_RADIUS_KM, gt=0, le=REQUEST_MAX_RADIUS_KM, description="Widest search radius"),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key are not notified twice"),
     user: dict = Depends(verify_firebase_token)
 ):
     """
     Request blood and notify nearby donors
+
+    The search starts at REQUEST_START_RADIUS_KM and doubles until it holds
+    target_count eligible donors or reaches max_radius_km; the nearest
+    target_count are notified and radius_km reports where the search stopped.
+
+    Notifications are written to the persistent outbox and delivered by
+    background workers; progress is at /notifications/jobs/{request_id}.
+
+    Identical requests (same blood group, options and ~1 km location cell)
+    within REQUEST_COALESCE_WINDOW seconds of each other are coalesced: the
+    first one matches and notifies donors, later ones get its result with
+    coalesced_with set to its request id (whose job tracks the delivery).
+
+    In emergency mode push notifications go to topic conditions covering the
+    matching blood groups in every region within radius_km: a few
+    sends however many donors match. Topics are coarse, so donors somewhat
+    beyond the radius and donors still in their donation interval are
+    alerted too.
     """
-    # Find nearby donors with matching blood group
-    donors = list(donor_collection.find({"blood_group": blood_group}, {"_id": 0}))
-    
-    nearby_donors = []
-    donor_tokens = []
-    
-    for donor in donors:
-        dist = calculate_distance(latitude, longitude, donor["latitude"], donor["longitude"])
-        if dist <= 50:  # Notify donors within 50km
-            nearby_donors.append(donor)
-            if "fcm_token" in donor and donor["fcm_token"]:
-                donor_tokens.append(donor["fcm_token"])
-    
-    # Send push notifications to matching donors
-    if donor_tokens:
-        send_donor_match_notification(
-            donor_tokens=donor_tokens,
-            blood_type=blood_group,
-            requester_name=user.get("name", "Someone"),
-            location=location
+    blood_request = await notification_outbox.open_request(idempotency_key or uuid.uuid4().hex, user.get("uid"))
+    if blood_request.get("response"):
+        return {**blood_request["response"], "duplicate": True}
+    request_id = blood_request["_id"]
+
+    coalesce_key = None
+    if request_coalescer.enabled:
+        # Identical requests from the same place (e.g. several staff of one hospital) share the
+        # first one's match and fan-out
+        coalesce_key = request_coalescer.key(
+            blood_group, latitude, longitude, compatible=compatible, notify_sms=notify_sms,
+            emergency=emergency, target_count=target_count, max_radius_km=max_radius_km,
         )
-        
-    return {
+        leader_id = await request_coalescer.join(coalesce_key, request_id)
+        if leader_id is not None:
+            shared = await request_coalescer.wait_for(leader_id)
+            if shared is not None:
+                # The follower may track the leader's delivery at /notifications/jobs/{leader_id}
+                await notification_outbox.add_reader(leader_id, user.get("uid"))
+                response = {**shared, "request_id": request_id, "coalesced_with": leader_id}
+                await notification_outbox.close_request(request_id, response)
+                return response
+            # The leader failed or is stuck: handle this request on its own
+            coalesce_key = None
+
+    response = None
+    try:
+        response = await match_and_notify(
+            request_id, blood_group, location, latitude, longitude, user,
+            compatible, notify_sms, emergency, target_count, max_radius_km,
+        )
+        await notification_outbox.close_request(request_id, response)
+    finally:
+        # Also on errors and cancellation: followers get None and stop waiting for this leader
+        if coalesce_key:
+            await request_coalescer.publish(coalesce_key, request_id, response)
+    return response
+
+
+async def match_and_notify(
+    request_id: str,
+    blood_group: str,
+    location: str,
+    latitude: float,
+    longitude: float,
+    user: dict,
+    compatible: bool,
+    notify_sms: bool,
+    emergency: bool,
+    target_count: int,
+    max_radius_km: float
+) -> dict:
+    """Find donors for a blood request, queue its notifications in the outbox and build the response"""
+    blood_groups = list(compatible_donor_groups(blood_group)) if compatible else [blood_group]
+    now = datetime.now(timezone.utc)
+
+    # Find nearby eligible donors with matching blood group(s): in-memory grid when loaded, MongoDB otherwise
+    donor_index.refresh_if_stale(sync_donor_collection, read_donor_state)
+    if donor_index.ready:
+        with stage_timer("index_query"):
+            distances, tokens, ids, groups, radius_km = donor_index.query_expanding(
+                blood_groups, latitude, longitude, target_count, max_radius_km,
+                REQUEST_START_RADIUS_KM, eligible_at=now.timestamp()
+            )
+        nearby_donors = [
+            {"_id": donor_id, "distance_km": float(distance), "fcm_token": token, "blood_group": group}
+            for distance, token, donor_id, group in zip(distances, tokens, ids, groups)
+        ]
+        if notify_sms and nearby_donors:
+            # The grid does not hold phone numbers; fetch just those for the matched donors
+            with stage_timer("mongo_query"):
+                contacts = await donor_collection.find(
+                    {"_id": {"$in": [ObjectId(d["_id"]) for d in nearby_donors if ObjectId.is_valid(d["_id"])]}},
+                    {"contact": 1},
+                ).to_list(None)
+            contact_by_id = {str(doc["_id"]): doc.get("contact") for doc in contacts}
+            for donor in nearby_donors:
+                donor["contact"] = contact_by_id.get(donor["_id"])
+    else:
+        # $geoNear walks the 2dsphere index outwards, so the limit stops it at the target
+        with stage_timer("mongo_query"):
+            cursor = await donor_collection.aggregate([
+                geo_near_stage(
+                    latitude, longitude, {"blood_group": {"$in": blood_groups}, **eligible_query(now)}, max_radius_km
+                ),
+                {"$limit": target_count},
+                {"$project": {"fcm_token": 1, "blood_group": 1, "distance_km": 1, "contact": 1}},
+            ])
+            nearby_donors = await cursor.to_list(None)
+        DONORS_SCANNED.labels("mongo").inc(len(nearby_donors))
+        # Report the same ring the index search would have stopped at
+        radius_km = (
+            ring_radius(nearby_donors[-1]["distance_km"], REQUEST_START_RADIUS_KM, max_radius_km)
+            if len(nearby_donors) >= target_count else max_radius_km
+        )
+    DONORS_MATCHED.labels("request").inc(len(nearby_donors))
+
+    # Exact matches are notified first, then compatible donors, each closest first
+    if compatible:
+        nearby_donors.sort(key=lambda d: match_rank(blood_group, d["blood_group"], d["distance_km"]))
+    donor_phones = [donor["contact"] for donor in nearby_donors if notify_sms and donor.get("contact")]
+    if emergency:
+        donor_tokens = []
+        conditions = build_conditions(blood_groups, regions_within(latitude, longitude, radius_km))
+    else:
+        donor_tokens = [donor["fcm_token"] for donor in nearby_donors if donor.get("fcm_token")]
+        conditions = []
+
+    # Donors notified too often lately are skipped (topic broadcasts cannot be filtered per donor)
+    donor_tokens, fcm_throttled = await donor_throttle.filter(CHANNEL_FCM, donor_tokens)
+    donor_phones, sms_throttled = await donor_throttle.filter(CHANNEL_SMS, donor_phones)
+
+    # Persist the fan-out before answering so a worker restart cannot drop it
+    payload = {"blood_type": blood_group, "requester_name": user.get("name") or "Someone", "location": location}
+    await notification_outbox.enqueue(request_id, CHANNEL_FCM, donor_tokens, payload)
+    await notification_outbox.enqueue(request_id, CHANNEL_SMS, donor_phones, payload)
+    await notification_outbox.enqueue(request_id, CHANNEL_TOPIC, conditions, payload)
+
+    response = {
         "message": "Blood request sent",
+        "request_id": request_id,
         "donors_found": len(nearby_donors),
-        "notifications_sent": len(donor_tokens)
+        "radius_km": radius_km,
+        "exact_matches": sum(1 for donor in nearby_donors if donor["blood_group"] == blood_group),
+        "notifications_sent": len(donor_tokens),
+        "sms_sent": len(donor_phones),
+        "throttled": {"fcm": fcm_throttled, "sms": sms_throttled},
+        "emergency_broadcasts": len(conditions),
+        "dispatch_job_id": request_id if donor_tokens or donor_phones or conditions else None,
+        "coalesced_with": None
     }
+    return response
 
 # 📍 Get nearest donors (with optional filters)
-@router.get("/donors/nearby")
-def get_nearby_donors(
+# Donors are projected to the NearbyDonorsPage fields in MongoDB and serialized by orjson
+# straight from the BSON dicts; the model documents the response but is not instantiated.
+# Responses carry a donor-version ETag; a matching If-None-Match gets 304 before any query
+@router.get("/donors/nearby", response_model=NearbyDonorsPage, response_class=OrjsonResponse)
+async def get_nearby_donors(
+    request: Request,
     lat: float = Query(...),
     lon: float = Query(...),
     blood_group: str = Query(None),
-    limit: int = Query(10)
+    limit: int = Query(
+        None, ge=1, le=NEARBY_MAX_STREAM,
+        description=f"Page size (default 10, at most {NEARBY_MAX_PAGE_SIZE}); caps the total when streaming",
+    ),
+    compatible: bool = Query(False, description="Include donors of compatible blood groups, exact matches first"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    stream: bool = Query(
+        False, description="Stream every match as NDJSON instead of returning one page (haversine distances)"
+    )
 ):
-    donors = list(donor_collection.find({}, {"_id": 0}))
-    if not donors:
-        raise HTTPException(status_code=404, detail="No donors found")
+    # Filter by blood group (or every compatible group) if provided; donors still in their
+    # post-donation interval are never listed
+    if blood_group and compatible:
+        query = {"blood_group": {"$in": list(compatible_donor_groups(blood_group))}}
+    elif blood_group:
+        query = {"blood_group": blood_group}
+    else:
+        query = {}
+    query.update(eligible_query())
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not stream and limit and limit > NEARBY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Page size is limited to {NEARBY_MAX_PAGE_SIZE}; use stream=true")
+
+    version, etag, not_modified = await donor_etags.check(request)
+    if not_modified is not None:
+        return not_modified
+
+    started = time.perf_counter()
+
+    if stream:
+        # $geoNear returns donors already sorted by distance; a cursor resumes at its distance
+        origin = after[2] if after else (lat, lon)
+        pipeline = [
+            geo_near_stage(*origin, query, min_distance_km=after[0] if after else None),
+            *after_cursor_stages(after),
+        ]
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline.append({"$project": {"_id": 0, **DONOR_SUMMARY_PROJECTION, "distance_km": 1}})
+        return StreamingResponse(
+            stream_nearby_donors(lat, lon, await donor_collection.aggregate(pipeline)),
+            media_type="application/x-ndjson",
+            headers=donor_etags.headers(etag),
+        )
+
+    # First pages are cached per quantized location and donor version and computed at the
+    # cell centre; later pages follow the origin recorded in their cursor
+    page_size = limit or 10
+    cache_key = None
+    if after is not None:
+        origin = after[2]
+    elif nearby_cache.enabled and version is not None:
+        cache_key = nearby_cache.key(blood_group, lat, lon, page_size, compatible, version)
+        origin = nearby_cache.snap(lat, lon)
+    else:
+        origin = (lat, lon)
+
+    page = await nearby_cache.get(cache_key) if cache_key else None
+    outcome = "uncached" if cache_key is None else ("hit" if page is not None else "miss")
+    if page is None:
+        page = await nearby_page(origin, query, page_size, after)
+        if cache_key:
+            groups = list(compatible_donor_groups(blood_group)) if compatible else [blood_group]
+            groups = groups if blood_group else []
+            await nearby_cache.set(cache_key, page, nearby_cache.tags_for(groups, *origin, page["radius_km"]))
+
+    # Exact distances from the caller's own position (the page may have been computed at the cell centre);
+    # geodesic costs ~0.3 ms per donor, so it runs off the event loop
+    sorted_donors = [dict(donor) for donor in page["donors"]]
+    await asyncio.to_thread(refine_distances, lat, lon, sorted_donors)
+
+    # Among the nearest compatible donors, list exact blood group matches first
+    if blood_group and compatible:
+        sorted_donors.sort(key=lambda d: match_rank(blood_group, d["blood_group"], d["distance_km"]))
+    else:
+        sorted_donors.sort(key=lambda d: d["distance_km"])
 
-    # Filter by blood group if provided
-    if blood_group:
-        donors = [d for d in donors if d.get("blood_group") == blood_group]
+    DONORS_MATCHED.labels("nearby").inc(len(sorted_donors))
+    nearby_cache.observe(outcome, time.perf_counter() - started)
+    return OrjsonResponse(
+        {"count": len(sorted_donors), "donors": sorted_donors, "next_cursor": page["next_cursor"]},
+        headers=donor_etags.headers(etag),
+    )
 
+
+async def nearby_page(origin: Tuple[float, float], query: dict, page_size: int, after=None) -> dict:
+    """
+    One distance-ordered page of donors around `origin`
+
+    Returns:
+        {"donors", "next_cursor", "radius_km"} where radius_km bounds the page's
+        donors (None when the page is the last one), as stored in the nearby cache
+    """
+    # $geoNear returns donors already sorted by distance; a cursor resumes at its distance
+    with stage_timer("mongo_query"):
+        results = await donor_collection.aggregate([
+            geo_near_stage(*origin, query, min_distance_km=after[0] if after else None),
+            *after_cursor_stages(after),
+            {"$limit": page_size},
+            {"$project": {**DONOR_SUMMARY_PROJECTION, "distance_km": 1}},
+        ])
+        donors = await results.to_list(None)
+    DONORS_SCANNED.labels("mongo").inc(len(donors))
+    if not donors and after is None and await donor_collection.find_one({}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail="No donors found")
+
+    next_page = next_cursor(donors, page_size, origin, after)
     for donor in donors:
-        donor["distance_km"] = round(
-            calculate_distance(lat, lon, donor["latitude"], donor["longitude"]), 2
+        del donor["_id"]
+    return {
+        "donors": donors,
+        "next_cursor": next_page,
+        "radius_km": donors[-1]["distance_km"] if next_page else None,
+    }
+
+
+def refine_distances(lat: float, lon: float, donors: List[dict], exact: bool = True):
+    """
+    Replace $geoNear distances with distances from (lat, lon)
+
+    Args:
+        exact: Geodesic for every donor (a Python loop, for pages of at most NEARBY_MAX_PAGE_SIZE);
+            False keeps to the vectorized haversine (within 0.5%), as streams do
+    """
+    with stage_timer("distance"):
+        distances = batch_distances(
+            lat, lon,
+            [donor["latitude"] for donor in donors],
+            [donor["longitude"] for donor in donors],
+            refine_top_k=len(donors) if exact else None,
         )
+    for donor, distance in zip(donors, distances):
+        donor["distance_km"] = round(float(distance), 2)
+
+
+# Donors per NDJSON chunk; bounds server memory regardless of the result size
+STREAM_CHUNK_SIZE = 1000
+
 
-    sorted_donors = sorted(donors, key=lambda d: d["distance_km"])[:limit]
-    return {"count": len(sorted_donors), "donors": sorted_donors}
+async def stream_nearby_donors(lat: float, lon: float, cursor) -> AsyncIterator[bytes]:
+    """Yield donors from an aggregation cursor as NDJSON lines, in distance order"""
+    chunk = []
+    async for donor in cursor:
+        chunk.append(donor)
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            refine_distances(lat, lon, chunk, exact=False)
+            yield b"".join(orjson.dumps(d, option=orjson.OPT_APPEND_NEWLINE) for d in chunk)
+            chunk = []
+    if chunk:
+        refine_distances(lat, lon, chunk, exact=False)
+        yield b"".join(orjson.dumps(d, option=orjson.OPT_APPEND_NEWLINE) for d in chunk)
@@ -0,0 +1,69 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from database.connection import client
+from utils.readiness import startup, READY
+from utils.firebase_auth import firebase_configured
+from utils.donor_index import donor_index
+from utils.notification_service import fcm_service
+from utils.sms_service import sms_service
+from utils.notification_dispatcher import notification_dispatcher
+from utils.notification_outbox import notification_outbox
+from utils.topics import topic_subscriber
+
+router = APIRouter()
+
+# Dependencies that must be up before the instance takes traffic. Firebase is required once
+# credentials are configured (auth fails closed until it is up); without them the app runs
+# in limited mode. Its startup step keeps retrying either way
+REQUIRED = ("mongodb", "mongo_indexes") + (("firebase",) if firebase_configured() else ())
+
+# Seconds the readiness probe waits for a MongoDB ping
+PING_TIMEOUT = 1.0
+
+
+async def _mongo_status() -> dict:
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), PING_TIMEOUT)
+        return {"status": "ready"}
+    except Exception as e:
+        return {"status": "unavailable", "error": str(e) or type(e).__name__}
+
+
+def _donor_index_status() -> dict:
+    if donor_index.disabled:
+        status = "disabled"
+    elif donor_index.ready:
+        status = "ready"
+    else:
+        status = "loading" if donor_index.loading else "not_loaded"
+    return {"status": status, "donors": donor_index.size}
+
+
+# ✅ Readiness probe: 200 once every required dependency is up, 503 with details otherwise
+@router.get("/ready")
+async def readiness():
+    steps = startup.steps()
+    dependencies = {
+        "mongodb": await _mongo_status(),
+        "mongo_indexes": steps.get("mongo_indexes", {"status": "not_started"}),
+        "firebase": {
+            **steps.get("firebase", {"status": "not_started"}),
+            "messaging": "enabled" if fcm_service.enabled else "disabled",
+        },
+        "sms": {
+            "status": ("client_ready" if sms_service.client_ready else "configured")
+            if sms_service.enabled else "not_configured"
+        },
+        "donor_index": _donor_index_status(),
+        "notification_workers": {
+            "status": "ready" if all(
+                w.running for w in (notification_dispatcher, notification_outbox, topic_subscriber)
+            ) else "stopped"
+        },
+    }
+    ready = all(dependencies[name]["status"] == READY for name in REQUIRED)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "dependencies": dependencies},
+    )
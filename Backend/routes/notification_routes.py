@@ -0,0 +1,48 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends
+from utils.notification_dispatcher import notification_dispatcher
+from utils.notification_outbox import notification_outbox
+from utils.notification_service import fcm_service
+from utils.topics import topic_subscriber
+from utils.donor_throttle import donor_throttle
+from utils.firebase_auth import verify_firebase_token
+
+router = APIRouter()
+
+
+def mask_recipient(recipient: Optional[str]) -> Optional[str]:
+    """Last 4 characters of an FCM token, phone number or topic condition"""
+    if not recipient:
+        return recipient
+    return f"***{recipient[-4:]}" if len(recipient) > 4 else "***"
+
+
+def public_job(job: dict) -> dict:
+    """Job progress without the owner and readers and with masked recipients"""
+    return {
+        **{key: value for key, value in job.items() if key not in ("owner_uid", "reader_uids", "results")},
+        "results": [{**result, "token": mask_recipient(result["token"])} for result in job.get("results") or []],
+    }
+
+def can_read(job: dict, uid: Optional[str]) -> bool:
+    """Creators and coalesced followers may read a job; jobs from unauthenticated routes have no owner"""
+    return job.get("owner_uid") in (None, uid) or uid in job.get("reader_uids", [])
+
+# 📬 Progress of a queued notification job (only its creator and coalesced followers may read it)
+@router.get("/notifications/jobs/{job_id}")
+async def get_notification_job(job_id: str, user: dict = Depends(verify_firebase_token)):
+    # In-process jobs (welcome messages) first, then blood request fan-outs from the outbox
+    job = notification_dispatcher.get_job(job_id) or await notification_outbox.get_progress(job_id)
+    # Someone else's job is reported as missing
+    if job is None or not can_read(job, user.get("uid")):
+        raise HTTPException(status_code=404, detail="Notification job not found")
+    return public_job(job)
+
+# 📊 FCM delivery counters (sent, failed, retried, dead tokens pruned), topic subscriptions and throttling
+@router.get("/notifications/stats")
+async def get_notification_stats():
+    return {
+        **fcm_service.metrics,
+        "topic_subscriptions": topic_subscriber.metrics,
+        "donor_throttle": donor_throttle.stats(),
+    }
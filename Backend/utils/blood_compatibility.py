@@ -0,0 +1,40 @@
+"""
+ABO/Rh blood compatibility
+Precomputed table of which donor groups can give red cells to each recipient group
+"""
+
+from typing import Dict, Tuple
+
+BLOOD_GROUPS = ("O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+")
+
+
+def _can_donate(donor: str, recipient: str) -> bool:
+    """Red cell compatibility: donor antigens must be a subset of the recipient's"""
+    donor_abo, donor_rh = donor[:-1], donor[-1]
+    recipient_abo, recipient_rh = recipient[:-1], recipient[-1]
+    abo_ok = set(donor_abo.replace("O", "")) <= set(recipient_abo.replace("O", ""))
+    rh_ok = donor_rh == "-" or recipient_rh == "+"
+    return abo_ok and rh_ok
+
+
+# recipient -> compatible donor groups, exact match first
+COMPATIBLE_DONORS: Dict[str, Tuple[str, ...]] = {
+    recipient: (recipient,) + tuple(
+        donor for donor in BLOOD_GROUPS if donor != recipient and _can_donate(donor, recipient)
+    )
+    for recipient in BLOOD_GROUPS
+}
+
+
+def compatible_donor_groups(recipient: str) -> Tuple[str, ...]:
+    """
+    Donor blood groups that can give to `recipient`
+
+    Unknown groups only match themselves.
+    """
+    return COMPATIBLE_DONORS.get(recipient, (recipient,))
+
+
+def match_rank(recipient: str, donor_group: str, distance_km: float) -> Tuple[bool, float]:
+    """Sort key ranking exact blood group matches first, then by distance"""
+    return donor_group != recipient, distance_km
@@ -0,0 +1,155 @@
+"""
+Single-flight coalescing of duplicate blood requests
+Staff at one hospital often request the same blood group within seconds
+of each other. The first request in a window leads: it matches donors and
+fans out notifications. Identical requests arriving while the window is
+open wait for the leader's response instead of notifying the same donors
+again. Leadership is claimed in MongoDB so it holds across workers.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database.connection import blood_request_collection, coalesce_collection
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Elects one leader per coalescing key and window and hands its response to followers"""
+
+    def __init__(
+        self,
+        window: float = 30.0,
+        grid_deg: float = 0.01,
+        wait_timeout: float = 15.0,
+        poll_interval: float = 0.1
+    ):
+        """
+        Args:
+            window: Seconds after a leader starts during which identical requests coalesce (0 = off)
+            grid_deg: Quantization step for the request location (0.01 deg ~ 1.1 km)
+            wait_timeout: Seconds a follower waits for the leader before handling the request itself
+            poll_interval: Seconds between checks for a leader running in another worker
+        """
+        self.window = window
+        self.grid_deg = grid_deg
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.metrics = {"leaders": 0, "coalesced": 0, "wait_timeouts": 0}
+
+        # key -> (leader request id, monotonic expiry): skips the MongoDB claim for local duplicates
+        self._leaders: Dict[str, Tuple[str, float]] = {}
+        # leader request id -> its response, resolved by publish() in this worker
+        self._responses: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def key(self, blood_group: str, latitude: float, longitude: float, **options) -> str:
+        """
+        Coalescing key: blood group, quantized location and every option that changes the outcome
+
+        Requests a few metres apart but on either side of a grid line get different keys.
+        """
+        row, col = math.floor(latitude / self.grid_deg), math.floor(longitude / self.grid_deg)
+        suffix = "|".join(f"{name}={options[name]}" for name in sorted(options))
+        return f"{blood_group}|{row}|{col}|{suffix}"
+
+    async def join(self, key: str, request_id: str) -> Optional[str]:
+        """
+        Become the leader for `key` or find the current one
+
+        Returns:
+            None if `request_id` now leads, otherwise the leader's request id
+        """
+        now = time.monotonic()
+        self._leaders = {k: v for k, v in self._leaders.items() if v[1] > now}
+        local = self._leaders.get(key)
+        if local is not None:
+            return local[0]
+
+        claimed_at = datetime.now(timezone.utc)
+        expires_at = claimed_at + timedelta(seconds=self.window)
+        try:
+            # Takes over an expired claim or inserts a new one; a live claim makes the upsert collide
+            claim = await coalesce_collection.find_one_and_update(
+                {"_id": key, "expires_at": {"$lte": claimed_at}},
+                {"$set": {"request_id": request_id, "expires_at": expires_at}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            claim = await coalesce_collection.find_one({"_id": key})
+            if claim is None:
+                # The claim expired and was removed in between; lead without retrying
+                claim = {"request_id": request_id, "expires_at": expires_at}
+
+        leader_id = claim["request_id"]
+        remaining = (claim["expires_at"].replace(tzinfo=timezone.utc) - claimed_at).total_seconds()
+        self._leaders[key] = (leader_id, now + max(remaining, 0.0))
+        if leader_id == request_id:
+            self.metrics["leaders"] += 1
+            self._responses[request_id] = asyncio.get_running_loop().create_future()
+            return None
+        return leader_id
+
+    async def wait_for(self, leader_id: str) -> Optional[dict]:
+        """
+        The leader's response, or None if it failed or did not answer within wait_timeout
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        future = self._responses.get(leader_id)
+        try:
+            if future is not None:
+                response = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            else:
+                response = None
+                while time.monotonic() < deadline:
+                    request = await blood_request_collection.find_one({"_id": leader_id}, {"response": 1})
+                    if request is not None and request.get("response"):
+                        response = request["response"]
+                        break
+                    await asyncio.sleep(self.poll_interval)
+        except asyncio.TimeoutError:
+            response = None
+
+        if response is None:
+            self.metrics["wait_timeouts"] += 1
+        else:
+            self.metrics["coalesced"] += 1
+        return response
+
+    async def publish(self, key: str, request_id: str, response: Optional[dict]):
+        """
+        Hand the leader's response to local followers (None if the leader failed)
+
+        A failed leader also gives up its claim so the next request leads afresh.
+        """
+        future = self._responses.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+        if response is None:
+            if self._leaders.get(key, (None,))[0] == request_id:
+                del self._leaders[key]
+            try:
+                await coalesce_collection.delete_one({"_id": key, "request_id": request_id})
+            except Exception as e:
+                logger.warning(f"Could not release coalescing claim {key}: {e}")
+
+
+# Global request coalescer instance
+request_coalescer = RequestCoalescer(
+    window=float(os.getenv("REQUEST_COALESCE_WINDOW", "30")),
+    grid_deg=float(os.getenv("REQUEST_COALESCE_GRID_DEG", "0.01")),
+    wait_timeout=float(os.getenv("REQUEST_COALESCE_WAIT_TIMEOUT", "15")),
+)
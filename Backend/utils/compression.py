@@ -0,0 +1,39 @@
+"""
+Response compression
+Donor lists are large, repetitive JSON that mobile clients on poor
+networks download in full. Bodies above a size threshold are compressed
+with brotli when the optional brotli-asgi package is installed and the
+client accepts it, and with gzip otherwise.
+"""
+
+import logging
+
+from starlette.middleware.gzip import GZipMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+def add_compression(app, minimum_size: int = 1000, gzip_level: int = 6, brotli_quality: int = 4) -> str:
+    """
+    Install the compression middleware on `app`
+
+    Args:
+        app: FastAPI application
+        minimum_size: Bodies smaller than this many bytes are sent uncompressed
+        gzip_level: zlib level (1-9); 6 trades little size for much less CPU than 9
+        brotli_quality: Brotli quality (0-11); low levels compress faster than gzip at a better ratio
+
+    Returns:
+        "brotli", "gzip" or "off" (minimum_size < 0)
+    """
+    if minimum_size < 0:
+        return "off"
+    try:
+        from brotli_asgi import BrotliMiddleware  # optional dependency
+    except ImportError:
+        app.add_middleware(GZipMiddleware, minimum_size=minimum_size, compresslevel=gzip_level)
+        return "gzip"
+
+    # Falls back to gzip itself for clients that do not accept br
+    app.add_middleware(BrotliMiddleware, minimum_size=minimum_size, quality=brotli_quality, gzip_fallback=True)
+    return "brotli"
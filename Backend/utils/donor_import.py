@@ -0,0 +1,166 @@
+"""
+Streaming bulk donor import
+Parses a CSV or NDJSON request body line by line, validates rows against
+the Donor model and writes them in unordered insert_many batches, so a
+registry of any size is imported with constant memory.
+"""
+
+import csv
+import json
+import logging
+from collections import defaultdict
+from functools import partial
+from typing import AsyncIterator, Dict, List, Optional
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from models.donor_model import Donor
+from utils.notification_dispatcher import notification_dispatcher, DispatchQueueFull
+from utils.notification_service import send_bulk_welcome_notification, FCM_MULTICAST_LIMIT
+from utils.topics import topic_subscriber, donor_topics
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering the whole body (decoded per row by iter_rows)"""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+async def iter_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple]:
+    """
+    Yield (row_number, dict or parse error message) for each non-empty data row
+
+    CSV input must have a header row; quoted fields may not contain newlines.
+    Lines that are not valid UTF-8 are reported as row errors.
+    """
+    header: Optional[List[str]] = None
+    row_number = 0
+    async for raw in iter_lines(chunks):
+        if not raw.strip():
+            continue
+        if fmt == "csv" and header is None:
+            line = raw.decode("utf-8-sig", errors="replace")
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+
+        row_number += 1
+        try:
+            # UnicodeDecodeError is a ValueError
+            line = raw.decode("utf-8-sig")
+            if fmt == "csv":
+                values = next(csv.reader([line]))
+                row = {name: value for name, value in zip(header, values) if value != ""}
+            else:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("each NDJSON line must be a JSON object")
+        except (ValueError, csv.Error) as e:
+            yield row_number, f"Could not parse row: {e}"
+            continue
+        yield row_number, row
+
+
+class DonorImport:
+    """Accumulates one bulk import: insert batches, per-row errors and welcome notifications"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.welcome_job_ids: List[str] = []
+        self.welcome_skipped = 0
+
+        self._batch: List[dict] = []
+        self._batch_rows: List[int] = []
+        self._welcome_tokens: Dict[str, List[str]] = defaultdict(list)
+
+    def _error(self, row_number: int, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    async def add(self, row_number: int, row):
+        """Validate one parsed row and queue it for insertion"""
+        if isinstance(row, str):
+            self._error(row_number, row)
+            return
+        try:
+            document = Donor(**row).to_document()
+        except ValidationError as e:
+            self._error(row_number, "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            return
+
+        self._batch.append(document)
+        self._batch_rows.append(row_number)
+        if len(self._batch) >= INSERT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        """Write the current batch and queue welcome messages and topic subscriptions for the donors that landed"""
+        if not self._batch:
+            return
+        batch, rows = self._batch, self._batch_rows
+        self._batch, self._batch_rows = [], []
+
+        failed_indexes = set()
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_indexes.add(error["index"])
+                self._error(rows[error["index"]], error.get("errmsg", "write failed"))
+
+        for index, document in enumerate(batch):
+            if index in failed_indexes:
+                continue
+            self.inserted += 1
+            if document.get("fcm_token"):
+                topic_subscriber.add(document["fcm_token"], donor_topics(document))
+                tokens = self._welcome_tokens[document["blood_group"]]
+                tokens.append(document["fcm_token"])
+                if len(tokens) >= FCM_MULTICAST_LIMIT:
+                    await self._send_welcome(document["blood_group"])
+
+    async def _send_welcome(self, blood_group: str):
+        tokens = self._welcome_tokens.pop(blood_group, [])
+        if not tokens:
+            return
+        try:
+            job_id = await notification_dispatcher.submit(
+                "welcome_bulk", tokens, partial(send_bulk_welcome_notification, tokens, blood_group)
+            )
+            self.welcome_job_ids.append(job_id)
+        except DispatchQueueFull as e:
+            # The donors are saved; skipping the welcome message is acceptable
+            logger.warning(f"Skipped {len(tokens)} welcome notifications: {e}")
+            self.welcome_skipped += len(tokens)
+
+    async def finish(self) -> dict:
+        """Flush what is left and return the import summary"""
+        await self.flush()
+        for blood_group in list(self._welcome_tokens):
+            await self._send_welcome(blood_group)
+        return {
+            "message": "Bulk import finished",
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "dispatch_job_ids": self.welcome_job_ids,
+            "welcome_notifications_skipped": self.welcome_skipped,
+        }
@@ -0,0 +1,446 @@
+"""
+In-memory spatial index of donors
+Keeps donor coordinates and FCM tokens in compact per-cell columns so
+radius matches only touch the grid cells around the requester
+"""
+
+import math
+import os
+import time
+import logging
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from utils.geo_utils import haversine_distances
+from utils.eligibility import eligible_timestamp
+from utils.metrics import DONORS_SCANNED
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE_LAT = 111.32
+
+# Donor fields the index holds
+PROJECTION = {"blood_group": 1, "latitude": 1, "longitude": 1, "eligible_from": 1, "fcm_token": 1}
+
+# Catch-up queries re-read donors created this long before the previous read started:
+# ObjectIds are stamped by the client before the insert commits, and clocks differ
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+_scanned = DONORS_SCANNED.labels("index")
+
+
+def ring_radius(distance_km: float, start_km: float, max_km: float) -> float:
+    """
+    Smallest radius of the expanding search (start_km, 2 x start_km, ... max_km) covering distance_km
+    """
+    radius = start_km
+    while radius < distance_km and radius < max_km:
+        radius *= 2
+    return min(radius, max_km)
+
+
+class _Cell:
+    """Column storage for the donors of one blood group inside one grid cell"""
+
+    __slots__ = ("lats", "lons", "eligible", "tokens", "ids")
+
+    def __init__(self):
+        self.lats = array("d")
+        self.lons = array("d")
+        self.eligible = array("d")  # eligible_from as POSIX timestamps
+        self.tokens: List[Optional[str]] = []
+        self.ids: List[str] = []
+
+    def append(self, donor_id: str, lat: float, lon: float, eligible: float, token: Optional[str]):
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self.eligible.append(eligible)
+        self.tokens.append(token or None)
+        self.ids.append(donor_id)
+
+
+class DonorSpatialIndex:
+    """
+    Process-local donor index: blood_group -> grid cell -> donor columns
+
+    The index is loaded once from MongoDB and updated incrementally on local
+    inserts. Writes made by other workers are detected through the donor
+    collection version counter; new donors are then fetched by _id (which
+    starts with the creation time) and appended. Only a bumped 'rebuild'
+    counter, meaning existing donors changed, triggers a full reload.
+    """
+
+    def __init__(
+        self,
+        cell_size_deg: float = 0.5,
+        max_donors: int = 1_000_000,
+        refresh_interval: float = 30.0
+    ):
+        """
+        Args:
+            cell_size_deg: Grid cell edge in degrees (0.5 deg ~ 55 km of latitude)
+            max_donors: Upper bound on indexed donors; above it the index disables itself
+            refresh_interval: Minimum seconds between version checks against MongoDB
+        """
+        self.cell_size_deg = cell_size_deg
+        self.max_donors = max_donors
+        self.refresh_interval = refresh_interval
+        self._lon_cells = int(round(360.0 / cell_size_deg))
+
+        self._groups: Dict[str, Dict[Tuple[int, int], _Cell]] = {}
+        self._ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self._loading = False
+        self._last_check = 0.0
+        # Creation time from which the next catch-up reads (start of the previous read)
+        self._watermark: Optional[datetime] = None
+
+        self.size = 0
+        self.version: Optional[int] = None
+        self.rebuild: Optional[int] = None
+        self.metrics = {"full_loads": 0, "catch_ups": 0, "caught_up_donors": 0}
+        self.ready = False
+        self.disabled = False
+
+    @property
+    def loading(self) -> bool:
+        return self._loading
+
+    # ---- grid helpers ----
+
+    def cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Grid cell containing (lat, lon)"""
+        row = int(math.floor(lat / self.cell_size_deg))
+        col = int(math.floor(lon / self.cell_size_deg)) % self._lon_cells
+        return row, col
+
+    def cells_within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, int]]:
+        """Grid cells that can contain points within radius_km of (lat, lon)"""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+        dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+
+        rows = range(
+            int(math.floor((lat - dlat) / self.cell_size_deg)),
+            int(math.floor((lat + dlat) / self.cell_size_deg)) + 1,
+        )
+        first_col = int(math.floor((lon - dlon) / self.cell_size_deg))
+        last_col = min(int(math.floor((lon + dlon) / self.cell_size_deg)), first_col + self._lon_cells - 1)
+        cols = {col % self._lon_cells for col in range(first_col, last_col + 1)}
+
+        return [(row, col) for row in rows for col in cols]
+
+    # ---- loading and updates ----
+
+    def _insert(self, groups: Dict[str, Dict[Tuple[int, int], _Cell]], donor: dict):
+        cells = groups.setdefault(donor["blood_group"], {})
+        key = self.cell_of(donor["latitude"], donor["longitude"])
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = _Cell()
+        cell.append(
+            str(donor["_id"]), donor["latitude"], donor["longitude"],
+            eligible_timestamp(donor.get("eligible_from")), donor.get("fcm_token"),
+        )
+
+    def _disable(self, reason: str):
+        with self._lock:
+            logger.warning(f"Donor index disabled ({reason}), falling back to MongoDB")
+            self._loading = False
+            self._groups = {}
+            self._ids = set()
+            self.size = 0
+            self.ready = False
+            self.disabled = True
+
+    def load(self, collection, state: Tuple[int, int]):
+        """
+        (Re)build the index from the donor collection
+
+        Args:
+            collection: MongoDB donor collection
+            state: Donor collection (version, rebuild) read before the snapshot started
+        """
+        started = time.perf_counter()
+        read_from = datetime.now(timezone.utc)
+        donors = collection.find(
+            {"latitude": {"$ne": None}, "longitude": {"$ne": None}}, PROJECTION, batch_size=10_000
+        )
+
+        groups: Dict[str, Dict[Tuple[int, int], _Cell]] = {}
+        ids: Set[str] = set()
+        for donor in donors:
+            if len(ids) >= self.max_donors:
+                donors.close()
+                self._disable(f"more than {self.max_donors} donors")
+                return
+            self._insert(groups, donor)
+            ids.add(str(donor["_id"]))
+
+        with self._lock:
+            self._loading = False
+            self._groups = groups
+            self._ids = ids
+            self.size = len(ids)
+            # Donors added locally during the load are fetched again by the next catch-up
+            self.version, self.rebuild = state
+            self._watermark = read_from
+            self.ready = True
+            self.metrics["full_loads"] += 1
+
+        logger.info(
+            f"Donor index loaded {len(ids)} donors (version {state[0]}) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def catch_up(self, collection, state: Tuple[int, int]):
+        """
+        Append donors created since the previous read instead of reloading everything
+
+        Args:
+            collection: MongoDB donor collection
+            state: Donor collection (version, rebuild) read before this query started
+        """
+        read_from = datetime.now(timezone.utc)
+        since = ObjectId.from_datetime(self._watermark - CATCH_UP_OVERLAP)
+        donors = list(collection.find(
+            {"_id": {"$gte": since}, "latitude": {"$ne": None}, "longitude": {"$ne": None}}, PROJECTION
+        ))
+
+        with self._lock:
+            self._loading = False
+            added = 0
+            for donor in donors:
+                donor_id = str(donor["_id"])
+                if donor_id in self._ids:
+                    continue
+                if self.size >= self.max_donors:
+                    over_limit = True
+                    break
+                self._insert(self._groups, donor)
+                self._ids.add(donor_id)
+                self.size += 1
+                added += 1
+            else:
+                over_limit = False
+                self.version = state[0]
+                self._watermark = read_from
+            self.metrics["catch_ups"] += 1
+            self.metrics["caught_up_donors"] += added
+
+        if over_limit:
+            self._disable("size limit reached")
+        elif added:
+            logger.info(f"Donor index caught up on {added} donors (version {state[0]})")
+
+    def load_in_background(self, collection, state_getter, only_if_stale: bool = False, delay: float = 0.0):
+        """
+        Start a reload or catch-up in a daemon thread unless one is already running
+
+        Args:
+            collection: Blocking (pymongo) donor collection
+            state_getter: Blocking callable returning the donor collection (version, rebuild)
+            only_if_stale: Skip the work when the version has not changed, and only catch up
+                on new donors unless the rebuild counter changed
+            delay: Seconds to wait before reading (spreads out warmups of many workers)
+        """
+        with self._lock:
+            if self._loading or self.disabled:
+                return
+            self._loading = True
+
+        def _run():
+            try:
+                if delay > 0:
+                    time.sleep(delay)
+                state = state_getter()
+                if only_if_stale and self.ready and state[1] == self.rebuild:
+                    if state[0] == self.version:
+                        with self._lock:
+                            self._loading = False
+                        return
+                    self.catch_up(collection, state)
+                    return
+                self.load(collection, state)
+            except Exception as e:
+                logger.error(f"Failed to load donor index: {e}")
+                with self._lock:
+                    self._loading = False
+
+        threading.Thread(target=_run, name="donor-index-loader", daemon=True).start()
+
+    def add(self, donor: dict, version: int):
+        """
+        Index a donor that this worker just inserted
+
+        Args:
+            donor: Donor document (must include '_id')
+            version: Donor collection version returned by the write
+        """
+        with self._lock:
+            if not self.ready or str(donor["_id"]) in self._ids:
+                return
+            over_limit = self.size >= self.max_donors
+            if not over_limit:
+                self._insert(self._groups, donor)
+                self._ids.add(str(donor["_id"]))
+                self.size += 1
+                # After a gap (another worker wrote in between) the version stays behind,
+                # so the next check catches up on the donors in between
+                if self.version is not None and version == self.version + 1:
+                    self.version = version
+
+        if over_limit:
+            self._disable("size limit reached")
+
+    def discard_tokens(self, tokens: List[str]):
+        """Forget FCM tokens that were pruned from the donor documents"""
+        dead = set(tokens)
+        with self._lock:
+            for cells in self._groups.values():
+                for cell in cells.values():
+                    for i, token in enumerate(cell.tokens):
+                        if token in dead:
+                            cell.tokens[i] = None
+
+    def refresh_if_stale(self, collection, version_getter):
+        """
+        Invalidation hook: catch up when another worker changed the donor collection
+
+        Checks the version counter at most once per refresh_interval, in a
+        background thread so the caller never waits on MongoDB.
+        """
+        now = time.monotonic()
+        if self.disabled or now - self._last_check < self.refresh_interval:
+            return
+        self._last_check = now
+
+        self.load_in_background(collection, version_getter, only_if_stale=True)
+
+    # ---- queries ----
+
+    def query_radius(
+        self,
+        blood_groups: List[str],
+        lat: float,
+        lon: float,
+        radius_km: float,
+        eligible_at: Optional[float] = None
+    ) -> Tuple[np.ndarray, List[Optional[str]], List[str], List[str]]:
+        """
+        Donors of the given blood groups within radius_km of (lat, lon)
+
+        Args:
+            eligible_at: POSIX time; donors whose eligible_from is later are skipped
+
+        Returns:
+            (distances_km, fcm_tokens, donor_ids, blood_groups), sorted by distance
+        """
+        groups = self._groups
+        lats, lons, eligible, tokens, ids, matched_groups = [], [], [], [], [], []
+        for key in self.cells_within(lat, lon, radius_km):
+            for blood_group in blood_groups:
+                cell = groups.get(blood_group, {}).get(key)
+                if cell is None:
+                    continue
+                # ids is appended last, so its length is safe to use for the other columns
+                count = len(cell.ids)
+                lats.append(np.array(cell.lats, dtype=np.float64)[:count])
+                lons.append(np.array(cell.lons, dtype=np.float64)[:count])
+                eligible.append(np.array(cell.eligible, dtype=np.float64)[:count])
+                tokens.extend(cell.tokens[:count])
+                ids.extend(cell.ids[:count])
+                matched_groups.extend([blood_group] * count)
+
+        _scanned.inc(len(ids))
+        if not ids:
+            return np.empty(0), [], [], []
+
+        distances = haversine_distances(lat, lon, np.concatenate(lats), np.concatenate(lons))
+        order = np.argsort(distances, kind="stable")
+        order = order[distances[order] <= radius_km]
+        if eligible_at is not None:
+            order = order[np.concatenate(eligible)[order] <= eligible_at]
+        return (
+            distances[order],
+            [tokens[i] for i in order],
+            [ids[i] for i in order],
+            [matched_groups[i] for i in order],
+        )
+
+    def query_expanding(
+        self,
+        blood_groups: List[str],
+        lat: float,
+        lon: float,
+        target_count: int,
+        max_radius_km: float,
+        start_radius_km: float,
+        eligible_at: Optional[float] = None
+    ) -> Tuple[np.ndarray, List[Optional[str]], List[str], List[str], float]:
+        """
+        Nearest `target_count` donors, searching rings of doubling radius
+
+        Each ring only reads the grid cells the previous rings did not, and the
+        search stops at the first radius holding target_count eligible donors,
+        so cells beyond it are never touched.
+
+        Returns:
+            (distances_km, fcm_tokens, donor_ids, blood_groups, radius_km) sorted by
+            distance, where radius_km is the ring the search stopped at
+        """
+        groups = self._groups
+        visited = set()
+        distances, eligible, tokens, ids, matched_groups = [], [], [], [], []
+        radius = min(start_radius_km, max_radius_km)
+        while True:
+            lats, lons = [], []
+            for key in self.cells_within(lat, lon, radius):
+                if key in visited:
+                    continue
+                visited.add(key)
+                for blood_group in blood_groups:
+                    cell = groups.get(blood_group, {}).get(key)
+                    if cell is None:
+                        continue
+                    count = len(cell.ids)
+                    lats.append(np.array(cell.lats, dtype=np.float64)[:count])
+                    lons.append(np.array(cell.lons, dtype=np.float64)[:count])
+                    eligible.append(np.array(cell.eligible, dtype=np.float64)[:count])
+                    tokens.extend(cell.tokens[:count])
+                    ids.extend(cell.ids[:count])
+                    matched_groups.extend([blood_group] * count)
+            if lats:
+                distances.append(haversine_distances(lat, lon, np.concatenate(lats), np.concatenate(lons)))
+
+            all_distances = np.concatenate(distances) if distances else np.empty(0)
+            keep = all_distances <= radius
+            if eligible_at is not None and len(all_distances):
+                keep &= np.concatenate(eligible) <= eligible_at
+            if np.count_nonzero(keep) >= target_count or radius >= max_radius_km:
+                break
+            radius = min(radius * 2, max_radius_km)
+
+        _scanned.inc(len(ids))
+        candidates = np.flatnonzero(keep)
+        order = candidates[np.argsort(all_distances[candidates], kind="stable")][:target_count]
+        return (
+            all_distances[order],
+            [tokens[i] for i in order],
+            [ids[i] for i in order],
+            [matched_groups[i] for i in order],
+            radius,
+        )
+
+
+# Global donor index instance
+donor_index = DonorSpatialIndex(
+    cell_size_deg=float(os.getenv("DONOR_INDEX_CELL_DEG", "0.5")),
+    max_donors=int(os.getenv("DONOR_INDEX_MAX_DONORS", "1000000")),
+    refresh_interval=float(os.getenv("DONOR_INDEX_REFRESH_SECONDS", "30")),
+)
@@ -0,0 +1,225 @@
+"""
+Per-donor notification throttling
+Caps how often one donor (FCM token or phone number) is notified about
+blood requests within a sliding window. Recipient lists are filtered in
+bulk before they reach the outbox, so throttled donors never cost an FCM
+or Twilio call.
+"""
+
+import os
+import time
+import hashlib
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+from utils.metrics import count_throttled
+
+logger = logging.getLogger(__name__)
+
+
+def _hash64(keys: List[str]) -> np.ndarray:
+    """Stable 64-bit hash per key (Python's hash() differs between workers)"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") for key in keys],
+        dtype=np.uint64,
+    )
+
+
+class MemoryThrottleBackend:
+    """
+    Sliding window of count-min sketches, one per time bucket
+
+    Each bucket is a depth x width table of uint16 counters (width 131072,
+    depth 4: 1 MiB), whatever the number of donors. Estimates never
+    undercount, so hash collisions can only throttle a donor early, never
+    let one through over the limit. Conservative updates (only counters at
+    the current minimum are raised) keep those early throttles rare while a
+    bucket holds fewer distinct recipients than its width.
+    """
+
+    name = "memory"
+
+    def __init__(self, window: float, buckets: int = 6, width: int = 1 << 17, depth: int = 4):
+        """
+        Args:
+            window: Sliding window in seconds
+            buckets: Time buckets the window is split into (expiry granularity = window / buckets)
+            width: Counters per sketch row
+            depth: Sketch rows (independent hashes)
+        """
+        self.bucket_seconds = window / buckets
+        self.width = width
+        self.depth = depth
+        self._tables = np.zeros((buckets, depth, width), dtype=np.uint16)
+        self._bucket_ids = np.full(buckets, -1, dtype=np.int64)
+
+    def _indexes(self, keys: List[str]) -> np.ndarray:
+        # Double hashing: row i uses h1 + i * h2 (Kirsch-Mitzenmacher)
+        hashes = _hash64(keys)
+        h1, h2 = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def _current_slot(self) -> int:
+        bucket_id = int(time.time() // self.bucket_seconds)
+        slot = bucket_id % len(self._bucket_ids)
+        if self._bucket_ids[slot] != bucket_id:
+            # The slot still holds a bucket that has left the window
+            self._tables[slot] = 0
+            self._bucket_ids[slot] = bucket_id
+        return slot
+
+    async def counts(self, keys: List[str]) -> List[int]:
+        oldest = int(time.time() // self.bucket_seconds) - len(self._bucket_ids) + 1
+        indexes = self._indexes(keys)
+        rows = np.arange(self.depth)[:, None]
+        totals = np.zeros(len(keys), dtype=np.int64)
+        for slot, bucket_id in enumerate(self._bucket_ids):
+            if bucket_id >= oldest:
+                totals += self._tables[slot][rows, indexes].min(axis=0)
+        return totals.tolist()
+
+    async def add(self, keys: List[str]):
+        if not keys:
+            return
+        table = self._tables[self._current_slot()]
+        indexes = self._indexes(keys)
+        estimates = table[np.arange(self.depth)[:, None], indexes].min(axis=0).astype(np.int64) + 1
+        estimates = np.minimum(estimates, np.iinfo(np.uint16).max).astype(np.uint16)
+        for row in range(self.depth):
+            np.maximum.at(table[row], indexes[row], estimates)
+
+
+class RedisThrottleBackend:
+    """
+    Redis-compatible store shared by every worker
+
+    One hash per time bucket maps an 8-byte digest of the recipient to its
+    count and expires with the window. Reading and counting are separate
+    round trips, so workers racing on the same donor may each let one
+    notification through.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, window: float, buckets: int = 6, prefix: str = "bb:throttle:"):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self.bucket_seconds = window / buckets
+        self.buckets = buckets
+        self.prefix = prefix
+
+    def _fields(self, keys: List[str]) -> List[str]:
+        return [f"{h:016x}" for h in _hash64(keys).tolist()]
+
+    async def counts(self, keys: List[str]) -> List[int]:
+        fields = self._fields(keys)
+        current = int(time.time() // self.bucket_seconds)
+        pipe = self._redis.pipeline(transaction=False)
+        for bucket_id in range(current - self.buckets + 1, current + 1):
+            pipe.hmget(f"{self.prefix}{bucket_id}", fields)
+        totals = [0] * len(keys)
+        for values in await pipe.execute():
+            for i, value in enumerate(values):
+                if value is not None:
+                    totals[i] += int(value)
+        return totals
+
+    async def add(self, keys: List[str]):
+        if not keys:
+            return
+        bucket_key = f"{self.prefix}{int(time.time() // self.bucket_seconds)}"
+        pipe = self._redis.pipeline(transaction=False)
+        for field in self._fields(keys):
+            pipe.hincrby(bucket_key, field, 1)
+        pipe.expire(bucket_key, int(self.bucket_seconds * (self.buckets + 1)))
+        await pipe.execute()
+
+
+class DonorThrottle:
+    """Drops recipients already notified max_per_window times within the window"""
+
+    def __init__(self, backend=None, max_per_window: int = 3, window: float = 3600.0):
+        """
+        Args:
+            backend: MemoryThrottleBackend, RedisThrottleBackend or None to disable throttling
+            max_per_window: Blood request notifications one donor may get per window and channel
+            window: Sliding window in seconds
+        """
+        self.backend = backend
+        self.max_per_window = max_per_window
+        self.window = window
+        self.metrics = {"allowed": 0, "throttled": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def filter(self, channel: str, recipients: List[str]) -> Tuple[List[str], int]:
+        """
+        Remove throttled recipients and count a notification for the rest
+
+        Args:
+            channel: "fcm" or "sms"; limits apply per channel
+            recipients: Tokens or phone numbers in priority order (duplicates are dropped)
+
+        Returns:
+            (recipients to notify in their original order, number throttled)
+        """
+        recipients = list(dict.fromkeys(recipients))
+        if not self.enabled or not recipients:
+            return recipients, 0
+
+        keys = [f"{channel}:{recipient}" for recipient in recipients]
+        try:
+            counts = await self.backend.counts(keys)
+            allowed = [i for i, count in enumerate(counts) if count < self.max_per_window]
+            await self.backend.add([keys[i] for i in allowed])
+        except Exception as e:
+            # Failing open: a missed limit is better than a missed blood request
+            logger.warning(f"Donor throttle unavailable, notifying everyone: {e}")
+            return recipients, 0
+
+        throttled = len(recipients) - len(allowed)
+        self.metrics["allowed"] += len(allowed)
+        self.metrics["throttled"] += throttled
+        count_throttled(channel, throttled)
+        return [recipients[i] for i in allowed], throttled
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name if self.enabled else None,
+            "max_per_window": self.max_per_window,
+            "window_seconds": self.window,
+            **self.metrics,
+        }
+
+
+def build_throttle_backend(kind: str, window: float, url: str, width: int):
+    """Backend named by DONOR_THROTTLE_BACKEND: 'memory', 'redis' or 'off'"""
+    if kind == "off":
+        return None
+    if kind == "redis":
+        try:
+            return RedisThrottleBackend(url, window)
+        except ImportError:
+            logger.warning("redis package not installed, using the in-memory donor throttle")
+    return MemoryThrottleBackend(window, width=width)
+
+
+_window = float(os.getenv("DONOR_THROTTLE_WINDOW", "3600"))
+
+# Global donor throttle instance
+donor_throttle = DonorThrottle(
+    backend=build_throttle_backend(
+        os.getenv("DONOR_THROTTLE_BACKEND", "memory"),
+        _window,
+        os.getenv("DONOR_THROTTLE_URL", "redis://localhost:6379/0"),
+        int(os.getenv("DONOR_THROTTLE_WIDTH", str(1 << 17))),
+    ),
+    max_per_window=int(os.getenv("DONOR_THROTTLE_MAX", "3")),
+    window=_window,
+)
@@ -0,0 +1,78 @@
+"""
+Donation eligibility helpers
+Whole-blood donors must wait a fixed interval between donations; donors
+store the date they become eligible again so matching can filter on it.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# Minimum days between whole-blood donations
+DONATION_INTERVAL_DAYS = int(os.getenv("DONATION_INTERVAL_DAYS", "56"))
+
+# eligible_from of donors who never donated (a real date keeps the index range simple)
+ALWAYS_ELIGIBLE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Accepted last_donated formats besides ISO 8601, day-first like the rest of the app
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y")
+
+
+def parse_donation_date(value) -> Optional[datetime]:
+    """
+    Parse a last_donated value into a UTC datetime
+
+    Args:
+        value: datetime, ISO 8601 string or one of DATE_FORMATS (None/"" allowed)
+
+    Returns:
+        Timezone-aware UTC datetime, or None if the donor never donated
+
+    Raises:
+        ValueError: if the string is not a recognised date
+    """
+    if value is None or isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        if not text:
+            return None
+        try:
+            parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            for fmt in DATE_FORMATS:
+                try:
+                    parsed = datetime.strptime(text, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"Unrecognised date: {text!r}")
+
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        # MongoDB stores naive datetimes as UTC
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def eligible_from(last_donated: Optional[datetime]) -> datetime:
+    """Date a donor may donate again"""
+    if last_donated is None:
+        return ALWAYS_ELIGIBLE
+    return last_donated + timedelta(days=DONATION_INTERVAL_DAYS)
+
+
+def eligible_query(now: Optional[datetime] = None) -> dict:
+    """Query fragment matching donors who may donate at `now` (default: current time)"""
+    return {"eligible_from": {"$lte": now or datetime.now(timezone.utc)}}
+
+
+def eligible_timestamp(value) -> float:
+    """eligible_from as a POSIX timestamp; donors without one (not backfilled) never match"""
+    if value is None:
+        return float("inf")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
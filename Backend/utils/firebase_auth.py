@@ -1,9 +1,32 @@
-import firebase_admin
-from firebase_admin import credentials, auth
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 import os
 import json
+import logging
+import threading
+from utils.token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
+
+# firebase_admin is imported inside the functions below: it adds ~0.5 s to application startup
+
+# Google's public certificates for Firebase ID tokens
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# Verified tokens are reused until their 'exp' claim (bounded by size and max TTL)
+token_cache = TokenCache(
+    max_entries=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+    max_ttl=float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "3600")),
+)
+
+_cert_refresh_thread = None
+
+
+def firebase_configured() -> bool:
+    """True if Firebase credentials are set (auth must then never fall back to the dev user)"""
+    return bool(os.getenv('FIREBASE_CREDENTIALS') or os.getenv('FIREBASE_CREDENTIALS_JSON'))
+
 
 # Initialize Firebase Admin SDK
 def initialize_firebase():
@@ -12,6 +35,9 @@ def initialize_firebase():
     Set FIREBASE_CREDENTIALS environment variable with path to service account JSON
     Or set FIREBASE_CREDENTIALS_JSON with the JSON content directly
     """
+    import firebase_admin
+    from firebase_admin import credentials
+
     try:
         # Check if already initialized
         firebase_admin.get_app()
@@ -28,11 +54,16 @@ def initialize_firebase():
         cred = credentials.Certificate(cred_path)
         firebase_admin.initialize_app(cred)
         print("Firebase initialized from credentials file")
+        start_certificate_refresh()
     elif cred_json:
         cred_dict = json.loads(cred_json)
         cred = credentials.Certificate(cred_dict)
         firebase_admin.initialize_app(cred)
         print("Firebase initialized from credentials JSON")
+        start_certificate_refresh()
+    elif cred_path:
+        # Configured but unreadable: fail (and retry) rather than run without auth
+        raise FileNotFoundError(f"FIREBASE_CREDENTIALS file not found: {cred_path}")
     else:
         # For development: Initialize without credentials (limited functionality)
         print("WARNING: Firebase credentials not found. Running in limited mode.")
@@ -40,6 +71,41 @@ def initialize_firebase():
         # You can still run the app, but auth verification will be disabled
         return None
 
+def prefetch_certificates():
+    """
+    Fetch Google's token-signing certificates through the SDK's own HTTP cache
+
+    verify_id_token() reuses that cache, so the first authenticated request
+    (and the ones right after a certificate rotation) no longer pay for the fetch.
+    """
+    from firebase_admin import auth
+
+    try:
+        verifier = auth._get_client(None)._token_verifier
+        verifier.request(ID_TOKEN_CERT_URL)
+        logger.info("Firebase token certificates refreshed")
+    except Exception as e:
+        # Verification still works; it just fetches on demand
+        logger.warning(f"Could not prefetch Firebase certificates: {e}")
+
+
+def start_certificate_refresh(interval: float = None):
+    """Prefetch certificates now and refresh them in a daemon thread every `interval` seconds"""
+    global _cert_refresh_thread
+    if _cert_refresh_thread is not None:
+        return
+    interval = interval or float(os.getenv("AUTH_CERT_REFRESH_SECONDS", "3600"))
+    stop = threading.Event()
+
+    def _refresh_loop():
+        while True:
+            prefetch_certificates()
+            if stop.wait(interval):
+                return
+
+    _cert_refresh_thread = threading.Thread(target=_refresh_loop, name="firebase-cert-refresh", daemon=True)
+    _cert_refresh_thread.start()
+
 # HTTP Bearer token security
 security = HTTPBearer()
 
@@ -48,28 +114,45 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Secu
     Verify Firebase ID token from request header
     Usage in route: user = Depends(verify_firebase_token)
     """
+    import firebase_admin
+    from firebase_admin import auth
+
+    # Check if Firebase is initialized
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        if firebase_configured():
+            # Credentials are set but initialization is still running or failed: fail closed
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is not available yet",
+                headers={"Retry-After": "30"},
+            )
+        # No credentials at all - skip verification in development
+        print("WARNING: Firebase not initialized, skipping auth verification")
+        return {"uid": "dev-user", "email": "dev@example.com"}
+
     try:
-        # Check if Firebase is initialized
-        try:
-            firebase_admin.get_app()
-        except ValueError:
-            # Firebase not initialized - skip verification in development
-            print("WARNING: Firebase not initialized, skipping auth verification")
-            return {"uid": "dev-user", "email": "dev@example.com"}
-        
         # Extract token from credentials
         token = credentials.credentials
         
-        # Verify the token
-        decoded_token = auth.verify_id_token(token)
+        # Reuse an earlier verification of the same token while it is still valid
+        user = token_cache.get(token)
+        if user is not None:
+            return user
+        
+        # Verify the token (signature check is CPU-bound, keep it off the event loop)
+        decoded_token = await run_in_threadpool(auth.verify_id_token, token)
         
         # Return user info
-        return {
+        user = {
             "uid": decoded_token['uid'],
             "email": decoded_token.get('email'),
             "name": decoded_token.get('name'),
             "email_verified": decoded_token.get('email_verified', False)
         }
+        token_cache.put(token, user, decoded_token.get('exp'))
+        return user
     except Exception as e:
         raise HTTPException(
             status_code=401,
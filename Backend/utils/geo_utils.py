@@ -1,7 +1,69 @@
-from geopy.distance import geodesic
+import numpy as np
+
+# geopy is imported on first use: importing it pulls in aiohttp and adds ~0.7 s to startup
+
+# Mean Earth radius (IUGG) used by the haversine fast path
+EARTH_RADIUS_KM = 6371.0088
 
 def calculate_distance(user_lat, user_lon, donor_lat, donor_lon):
     """Calculate distance in km between user and donor"""
+    from geopy.distance import geodesic
     user_loc = (user_lat, user_lon)
     donor_loc = (donor_lat, donor_lon)
     return geodesic(user_loc, donor_loc).km
+
+def haversine_distances(user_lat, user_lon, donor_lats, donor_lons):
+    """
+    Great-circle distance in km from one origin to many donors at once
+
+    Args:
+        user_lat, user_lon: Origin coordinates in degrees
+        donor_lats, donor_lons: Array-likes of donor coordinates in degrees
+
+    Returns:
+        NumPy array of distances (within ~0.5% of the geodesic distance)
+    """
+    lat1 = np.radians(user_lat)
+    lon1 = np.radians(user_lon)
+    lat2 = np.radians(np.asarray(donor_lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(donor_lons, dtype=np.float64))
+
+    a = (
+        np.sin((lat2 - lat1) / 2.0) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def batch_distances(user_lat, user_lon, donor_lats, donor_lons, refine_top_k=None):
+    """
+    Distances in km from one origin to many donors
+
+    Uses the vectorized haversine fast path for every donor and, when
+    refine_top_k is set, recomputes only the k closest with the exact geodesic.
+
+    Args:
+        user_lat, user_lon: Origin coordinates in degrees
+        donor_lats, donor_lons: Array-likes of donor coordinates in degrees
+        refine_top_k: Number of nearest candidates to refine with geodesic (None = none)
+
+    Returns:
+        NumPy array of distances aligned with the input arrays
+    """
+    lats = np.asarray(donor_lats, dtype=np.float64)
+    lons = np.asarray(donor_lons, dtype=np.float64)
+    distances = haversine_distances(user_lat, user_lon, lats, lons)
+
+    if refine_top_k and distances.size:
+        k = min(int(refine_top_k), distances.size)
+        if k < distances.size:
+            candidates = np.argpartition(distances, k - 1)[:k]
+        else:
+            candidates = np.arange(distances.size)
+        for i in candidates:
+            distances[i] = calculate_distance(user_lat, user_lon, lats[i], lons[i])
+
+    return distances
+
+def to_geojson_point(lat, lon):
+    """Build a GeoJSON Point for MongoDB (note: GeoJSON order is [longitude, latitude])"""
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
@@ -0,0 +1,105 @@
+"""
+HTTP revalidation for donor read endpoints
+Responses carry a weak ETag derived from the donor collection version
+(bumped by every donor write), the request's query string and the current
+eligibility bucket. A client sending it back in If-None-Match gets
+304 Not Modified before any query runs, so repeated identical polls cost
+one cached version lookup instead of a $geoNear and a full body.
+"""
+
+import os
+import time
+import hashlib
+import logging
+from typing import Optional
+
+from fastapi import Request, Response
+
+from database.connection import meta_collection, DONOR_VERSION_ID
+
+logger = logging.getLogger(__name__)
+
+# Clients may reuse a stored response only after revalidating it
+CACHE_CONTROL = "no-cache"
+
+
+class DonorETags:
+    """Builds donor-version ETags and answers conditional requests"""
+
+    def __init__(self, version_ttl: float = 1.0, eligibility_bucket: float = 600.0):
+        """
+        Args:
+            version_ttl: Seconds the version read from MongoDB is reused (0 = read on every request);
+                writes made in this worker are seen at once, other workers' within this delay
+            eligibility_bucket: Seconds after which ETags change even without writes, since donors
+                become eligible again with time alone (0 = never)
+        """
+        self.version_ttl = version_ttl
+        self.eligibility_bucket = eligibility_bucket
+        self._version: Optional[int] = None
+        self._read_at = 0.0
+        self.metrics = {"not_modified": 0, "full_responses": 0, "version_reads": 0}
+
+    def note_version(self, version: int):
+        """Record a version returned by bump_donor_version() in this worker"""
+        if self._version is None or version > self._version:
+            self._version = version
+        self._read_at = time.monotonic()
+
+    async def version(self) -> int:
+        """Current donor collection version, re-read at most once per version_ttl"""
+        now = time.monotonic()
+        if self._version is None or now - self._read_at >= self.version_ttl:
+            doc = await meta_collection.find_one({"_id": DONOR_VERSION_ID})
+            self._version = doc["version"] if doc else 0
+            self._read_at = now
+            self.metrics["version_reads"] += 1
+        return self._version
+
+    def etag(self, version: int, request: Request) -> str:
+        """Weak ETag for `request` at donor collection `version` (weak: bodies may be compressed)"""
+        query = hashlib.blake2b(str(request.url.query).encode(), digest_size=6).hexdigest()
+        bucket = int(time.time() // self.eligibility_bucket) if self.eligibility_bucket > 0 else 0
+        return f'W/"{version}-{bucket}-{query}"'
+
+    @staticmethod
+    def matches(if_none_match: Optional[str], etag: str) -> bool:
+        """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+    async def check(self, request: Request):
+        """
+        Evaluate If-None-Match for a donor read
+
+        Returns:
+            (donor version, etag, 304 response or None); a version lookup failure
+            skips revalidation and returns (None, None, None)
+        """
+        try:
+            version = await self.version()
+        except Exception as e:
+            logger.warning(f"Donor version unavailable, serving without ETag: {e}")
+            return None, None, None
+        etag = self.etag(version, request)
+        if self.matches(request.headers.get("if-none-match"), etag):
+            self.metrics["not_modified"] += 1
+            return version, etag, Response(status_code=304, headers=self.headers(etag))
+        self.metrics["full_responses"] += 1
+        return version, etag, None
+
+    @staticmethod
+    def headers(etag: Optional[str]) -> dict:
+        """Caching headers for a full response carrying `etag`"""
+        return {"ETag": etag, "Cache-Control": CACHE_CONTROL} if etag else {}
+
+
+# Global donor ETag instance
+donor_etags = DonorETags(
+    version_ttl=float(os.getenv("DONOR_ETAG_VERSION_TTL", "1")),
+    eligibility_bucket=float(os.getenv("DONOR_ETAG_ELIGIBILITY_BUCKET", "600")),
+)
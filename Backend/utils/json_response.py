@@ -0,0 +1,17 @@
+"""
+orjson-backed JSON responses
+Serializes plain dicts and lists (e.g. donor documents straight from
+MongoDB) without jsonable_encoder or pydantic models in between.
+"""
+
+from typing import Any
+
+import orjson
+from starlette.responses import JSONResponse
+
+
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered by orjson (datetimes become ISO 8601 strings, numpy scalars are supported)"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,142 @@
+"""
+Prometheus metrics
+Route latency histograms, per-stage timers (MongoDB, distance math, FCM,
+SMS) and donor/notification counters, served at /metrics. Label children
+are bound once at import so the hot path only does a dict lookup and an
+observe().
+"""
+
+import os
+import time
+from typing import Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# ---- HTTP requests ----
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+
+# ---- request path stages ----
+
+STAGES = ("mongo_query", "index_query", "distance", "fcm_multicast", "sms_send")
+
+STAGE_LATENCY = Histogram(
+    "bloodbuddy_stage_duration_seconds",
+    "Time spent in each stage of the request path",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+_stage_children = {stage: STAGE_LATENCY.labels(stage) for stage in STAGES}
+
+# ---- donors and notifications ----
+
+DONORS_SCANNED = Counter(
+    "bloodbuddy_donors_scanned_total",
+    "Candidate donors examined while matching",
+    ["source"],
+)
+DONORS_MATCHED = Counter(
+    "bloodbuddy_donors_matched_total",
+    "Donors returned by matching",
+    ["endpoint"],
+)
+NOTIFICATIONS = Counter(
+    "bloodbuddy_notifications_total",
+    "Notifications by channel and outcome",
+    ["channel", "outcome"],
+)
+_notification_children: Dict[tuple, Counter] = {
+    (channel, outcome): NOTIFICATIONS.labels(channel, outcome)
+    for channel in ("fcm", "sms")
+    for outcome in ("sent", "failed", "throttled")
+}
+
+
+class stage_timer:
+    """
+    Context manager observing the duration of one stage
+
+        with stage_timer("mongo_query"):
+            donors = await cursor.to_list(None)
+    """
+
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, stage: str):
+        self._child = _stage_children[stage]
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+def count_notifications(channel: str, sent: int, failed: int):
+    """Add one send's outcome to the notification counters"""
+    if sent:
+        _notification_children[(channel, "sent")].inc(sent)
+    if failed:
+        _notification_children[(channel, "failed")].inc(failed)
+
+
+def count_throttled(channel: str, throttled: int):
+    """Count recipients the per-donor throttle removed before a fan-out"""
+    if throttled:
+        _notification_children[(channel, "throttled")].inc(throttled)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency per route template
+
+    Routes are labelled by their template (e.g. /notifications/jobs/{job_id}),
+    never by the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status["code"]),
+            ).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> tuple:
+    """
+    (body, content type) for the /metrics endpoint
+
+    Under gunicorn (PROMETHEUS_MULTIPROC_DIR set by gunicorn.conf.py) every
+    worker writes its samples to that directory and any worker can serve
+    the aggregate.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
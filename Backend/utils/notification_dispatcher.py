@@ -0,0 +1,193 @@
+"""
+Background notification dispatcher
+Queues FCM sends so API responses do not wait on Firebase, and keeps
+per-job progress for the /notifications/jobs endpoint
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchQueueFull(Exception):
+    """Raised when the dispatch queue stays full for longer than the enqueue timeout"""
+
+
+class NotificationDispatcher:
+    """Bounded in-process queue drained by a fixed pool of asyncio worker tasks"""
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 1000,
+        max_jobs: int = 10000,
+        enqueue_timeout: float = 2.0
+    ):
+        """
+        Args:
+            workers: Number of concurrent worker tasks
+            max_queue: Jobs that may wait in the queue before callers are pushed back
+            max_jobs: Job records kept for status lookups (oldest finished ones are dropped)
+            enqueue_timeout: Seconds submit() waits for queue space before raising DispatchQueueFull
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Start the worker tasks (call from the application startup event)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"notification-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Notification dispatcher started with {self.workers} workers")
+
+    async def stop(self):
+        """Cancel the worker tasks; jobs still queued are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        kind: str,
+        tokens: List[str],
+        send: Callable[[], dict],
+        owner_uid: Optional[str] = None
+    ) -> str:
+        """
+        Queue a notification job
+
+        Args:
+            kind: Job type, e.g. "donor_match" or "welcome"
+            tokens: FCM tokens the job sends to (used for per-token progress)
+            send: Blocking callable performing the send; runs in a worker thread
+            owner_uid: Firebase uid allowed to read the job (None: any signed-in user)
+
+        Returns:
+            Job id for /notifications/jobs/{id}
+
+        Raises:
+            DispatchQueueFull: if the queue has no room within enqueue_timeout
+        """
+        if self._queue is None:
+            await self.start()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "owner_uid": owner_uid,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "total": len(tokens),
+            "sent": 0,
+            "failed": 0,
+            "tokens_pruned": 0,
+            "results": [],
+            "error": None,
+        }
+
+        self._remember(job)
+        try:
+            await asyncio.wait_for(self._queue.put((job, tokens, send)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self._jobs.pop(job_id, None)
+            raise DispatchQueueFull(f"Notification queue is full ({self.max_queue} jobs waiting)")
+
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Progress and per-token results of a job, or None if unknown/expired"""
+        return self._jobs.get(job_id)
+
+    def _remember(self, job: dict):
+        self._jobs[job["id"]] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest["status"] in ("queued", "running"):
+                break
+            self._jobs.pop(oldest_id)
+
+    async def _worker(self):
+        while True:
+            job, tokens, send = await self._queue.get()
+            job["status"] = "running"
+            try:
+                result = await asyncio.to_thread(send)
+                self._record_result(job, tokens, result)
+            except Exception as e:
+                logger.error(f"Notification job {job['id']} failed: {e}")
+                job["status"] = "failed"
+                job["error"] = str(e)
+                job["failed"] = job["total"]
+            finally:
+                job["finished_at"] = time.time()
+                self._queue.task_done()
+
+    @staticmethod
+    def _record_result(job: dict, tokens: List[str], result: dict):
+        """Turn a FirebaseNotificationService result into per-token progress"""
+        job["results"] = per_token_results(tokens, result)
+        job["tokens_pruned"] = result.get("tokens_pruned", 0)
+        job["sent"] = sum(1 for r in job["results"] if r["success"])
+        job["failed"] = job["total"] - job["sent"]
+        if result.get("success"):
+            job["status"] = "completed"
+        else:
+            # Some multicast batches failed to send while others went out
+            job["status"] = "partial" if job["sent"] else "failed"
+            job["error"] = result.get("error")
+
+
+def per_token_results(tokens: List[str], result: dict) -> List[dict]:
+    """
+    One {"token", "success", "message_id", "error"} entry per token of a send
+
+    Accepts the dict returned by FirebaseNotificationService.send_notification
+    or send_multicast (whose per-token responses are kept even when some batches failed).
+    """
+    responses = result.get("responses")
+    if responses is None and not result.get("success"):
+        return [{"token": token, "success": False, "message_id": None, "error": result.get("error")} for token in tokens]
+
+    if responses is None:
+        # Single-device send
+        return [{"token": tokens[0], "success": True, "message_id": result.get("message_id"), "error": None}]
+
+    return [
+        {
+            "token": token,
+            "success": response.success,
+            "message_id": response.message_id,
+            "error": str(response.exception) if response.exception else None,
+        }
+        for token, response in zip(tokens, responses)
+    ]
+
+
+# Global dispatcher instance
+notification_dispatcher = NotificationDispatcher(
+    workers=int(os.getenv("NOTIFICATION_WORKERS", "4")),
+    max_queue=int(os.getenv("NOTIFICATION_QUEUE_SIZE", "1000")),
+)
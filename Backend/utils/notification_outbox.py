@@ -0,0 +1,495 @@
+"""
+Persistent notification outbox
+Blood requests write their notification batches to MongoDB before
+responding; a pool of delivery workers claims batches with time-limited
+leases, renewed while a batch is being sent, so a worker restart mid
+fan-out only delays delivery. SMS progress is saved per recipient, so a
+re-claimed batch resumes where the previous worker stopped.
+"""
+
+import os
+import uuid
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database.connection import blood_request_collection, outbox_collection
+from utils.notification_dispatcher import per_token_results
+from utils.notification_service import fcm_service
+from utils.sms_service import sms_service
+from utils.firebase_auth import firebase_configured
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_FCM = "fcm"
+CHANNEL_SMS = "sms"
+# Emergency broadcasts: recipients are FCM topic conditions, one send each
+CHANNEL_TOPIC = "topic"
+
+# Seconds a batch waits before it is claimed again while its service is still starting up
+NOT_READY_BACKOFF = 10.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class NotificationOutbox:
+    """
+    MongoDB-backed outbox with leased, at-least-once delivery
+
+    Batch ids are derived from the request id, channel and batch number, so
+    enqueueing the same request twice (a retried HTTP call) is a no-op.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        batch_size: int = 500,
+        lease_seconds: float = 120.0,
+        max_attempts: int = 5,
+        poll_interval: float = 2.0
+    ):
+        """
+        Args:
+            workers: Delivery worker tasks per process
+            batch_size: Recipients per outbox document (500 = one FCM multicast); SMS batches
+                are capped at what the Twilio rate limit can send within one lease
+            lease_seconds: How long a claimed batch stays invisible to other workers; the
+                owner renews it every lease_seconds / 3 while delivering
+            max_attempts: Claims before a batch is marked failed
+            poll_interval: Idle seconds between claim attempts
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ---- requests and idempotency ----
+
+    async def open_request(self, idempotency_key: str, requester_uid: Optional[str]) -> dict:
+        """
+        Get or create the blood request record for an idempotency key
+
+        Keys are scoped to the requester, so one user reusing another's key
+        gets a new request rather than the other user's stored response.
+
+        Returns:
+            The request document; if it already has a 'response' the request was
+            completed before and the caller should return that response
+        """
+        idempotency_key = f"{requester_uid or 'anonymous'}:{idempotency_key}"
+        try:
+            return await blood_request_collection.find_one_and_update(
+                {"idempotency_key": idempotency_key},
+                {"$setOnInsert": {
+                    "_id": uuid.uuid4().hex,
+                    "requester_uid": requester_uid,
+                    "created_at": _now(),
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race with an identical concurrent request
+            return await blood_request_collection.find_one({"idempotency_key": idempotency_key})
+
+    async def add_reader(self, request_id: str, uid: Optional[str]):
+        """Let `uid` (the requester of a coalesced follower request) read this request's progress"""
+        if uid:
+            await blood_request_collection.update_one({"_id": request_id}, {"$addToSet": {"reader_uids": uid}})
+
+    async def close_request(self, request_id: str, response: dict):
+        """Store the response so retries with the same idempotency key get it back"""
+        await blood_request_collection.update_one({"_id": request_id}, {"$set": {"response": response}})
+
+    def batch_size_for(self, channel: str) -> int:
+        """Recipients per outbox document on `channel`"""
+        if channel == CHANNEL_SMS:
+            # One SMS batch must fit in a lease at the account rate, or it is sent again by another worker
+            return max(1, min(self.batch_size, int(self.lease_seconds * sms_service.rate_limiter.rate)))
+        return self.batch_size
+
+    async def enqueue(self, request_id: str, channel: str, recipients: List[str], payload: Dict) -> int:
+        """
+        Write one outbox document per batch of recipients
+
+        Args:
+            request_id: Blood request the notifications belong to
+            channel: CHANNEL_FCM (recipients are tokens), CHANNEL_SMS (phone numbers)
+                or CHANNEL_TOPIC (topic conditions)
+            recipients: Tokens or phone numbers, in priority order
+            payload: blood_type, requester_name and location for the message
+
+        Returns:
+            Number of batches written
+        """
+        if not recipients:
+            return 0
+
+        created_at = _now()
+        batch_size = self.batch_size_for(channel)
+        documents = [
+            {
+                "_id": f"{request_id}:{channel}:{number}",
+                "request_id": request_id,
+                "channel": channel,
+                "batch": number,
+                "recipients": recipients[start:start + batch_size],
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "lease_until": created_at,
+                "created_at": created_at,
+            }
+            for number, start in enumerate(range(0, len(recipients), batch_size))
+        ]
+
+        try:
+            await outbox_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Batches already written by an earlier attempt of the same request
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return len(documents)
+
+    async def get_progress(self, request_id: str) -> Optional[dict]:
+        """
+        Delivery progress of a blood request, shaped like a dispatcher job
+
+        owner_uid is the requester; reader_uids are requesters whose requests were coalesced into it.
+        """
+        batches = await outbox_collection.find({"request_id": request_id}).sort(
+            [("channel", 1), ("batch", 1)]
+        ).to_list(None)
+        if not batches:
+            return None
+        request = await blood_request_collection.find_one({"_id": request_id}, {"requester_uid": 1, "reader_uids": 1})
+
+        # Batches still being sent report the SMS results saved so far
+        results = [
+            r for batch in batches
+            for r in (batch.get("results") or list((batch.get("progress") or {}).values()))
+        ]
+        statuses = {batch["status"] for batch in batches}
+        if statuses <= {"delivered", "failed"}:
+            status = "failed" if statuses == {"failed"} else "completed"
+        else:
+            status = "running" if statuses & {"leased", "delivered", "failed"} else "queued"
+
+        return {
+            "id": request_id,
+            "kind": "donor_match",
+            "owner_uid": request.get("requester_uid") if request else None,
+            "reader_uids": request.get("reader_uids", []) if request else [],
+            "status": status,
+            "total": sum(len(batch["recipients"]) for batch in batches),
+            "batches": len(batches),
+            "batches_delivered": sum(1 for batch in batches if batch["status"] == "delivered"),
+            "sent": sum(1 for r in results if r["success"]),
+            "failed": sum(1 for r in results if not r["success"]),
+            "tokens_pruned": sum(batch.get("tokens_pruned", 0) for batch in batches),
+            "results": results,
+        }
+
+    # ---- delivery workers ----
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Start the delivery workers (call from the application startup event)"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{uuid.uuid4().hex[:8]}-{i}"), name=f"outbox-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Notification outbox started with {self.workers} delivery workers")
+
+    async def stop(self):
+        """Stop the workers; batches they hold are retried by others once their lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self, worker_id: str) -> Optional[dict]:
+        """Lease the oldest batch that is pending or whose previous lease expired"""
+        now = _now()
+        return await outbox_collection.find_one_and_update(
+            {
+                "status": {"$in": ["pending", "leased"]},
+                "lease_until": {"$lte": now},
+                "attempts": {"$lt": self.max_attempts},
+            },
+            {
+                "$set": {
+                    "status": "leased",
+                    "lease_owner": worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _fail_exhausted(self):
+        """Give up on batches whose lease expired after the last allowed attempt"""
+        await outbox_collection.update_many(
+            {"status": "leased", "lease_until": {"$lte": _now()}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed"}},
+        )
+
+    async def _worker(self, worker_id: str):
+        while True:
+            try:
+                batch = await self._claim(worker_id)
+                if batch is None:
+                    await self._fail_exhausted()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._deliver(batch, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker {worker_id} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, batch_id: str, worker_id: str, lease_lost: threading.Event):
+        """Extend the lease on a batch until cancelled; sets lease_lost if another worker took it over"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await outbox_collection.update_one(
+                    {"_id": batch_id, "lease_owner": worker_id, "status": "leased"},
+                    {"$set": {"lease_until": _now() + timedelta(seconds=self.lease_seconds)}},
+                )
+            except Exception as e:
+                # The lease may still be valid; try again on the next beat
+                logger.warning(f"Could not renew lease on outbox batch {batch_id}: {e}")
+                continue
+            if renewed.matched_count == 0:
+                logger.warning(f"Outbox worker {worker_id} lost the lease on batch {batch_id}")
+                lease_lost.set()
+                return
+
+    async def _save_progress(self, batch_id: str, worker_id: str, index: int, entry: dict) -> bool:
+        """Record one recipient's SMS result; False if this worker no longer holds the lease"""
+        saved = await outbox_collection.update_one(
+            {"_id": batch_id, "lease_owner": worker_id},
+            {"$set": {f"progress.{index}": entry}},
+        )
+        return saved.matched_count == 1
+
+    async def _deliver(self, batch: dict, worker_id: str):
+        """
+        Send one batch while renewing its lease
+
+        Transient errors are retried inside the services; if this raises
+        instead, the lease expires and another worker picks the batch up.
+        """
+        lease_lost = threading.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(batch["_id"], worker_id, lease_lost))
+        try:
+            await self._send(batch, worker_id, lease_lost)
+        finally:
+            heartbeat.cancel()
+            # Stops an SMS thread still sending after this task was cancelled
+            lease_lost.set()
+
+    async def _send_sms(self, batch: dict, worker_id: str, lease_lost: threading.Event) -> Optional[List[dict]]:
+        """
+        Send the recipients of an SMS batch that have no saved result yet
+
+        Returns:
+            Results in recipient order, or None if the lease was lost before the batch finished
+        """
+        payload = batch["payload"]
+        recipients = batch["recipients"]
+        progress = dict(batch.get("progress") or {})
+        pending = [index for index in range(len(recipients)) if str(index) not in progress]
+        message = sms_service.donor_match_bulk_message(
+            payload["blood_type"], payload["requester_name"], payload["location"]
+        )
+        loop = asyncio.get_running_loop()
+
+        def send() -> bool:
+            # Closing the generator early cancels the sends still queued
+            sends = sms_service.iter_bulk_sms([recipients[index] for index in pending], message)
+            for position, detail in sends:
+                index = pending[position]
+                entry = {
+                    "token": detail["recipient"],
+                    "success": detail["result"]["success"],
+                    "error": detail["result"].get("error"),
+                }
+                saved = asyncio.run_coroutine_threadsafe(
+                    self._save_progress(batch["_id"], worker_id, index, entry), loop
+                ).result(timeout=self.lease_seconds)
+                progress[str(index)] = entry
+                if not saved or lease_lost.is_set():
+                    return False
+            return True
+
+        if not await asyncio.to_thread(send):
+            return None
+        return [progress[str(index)] for index in range(len(recipients))]
+
+    async def _send_fcm(self, batch: dict, worker_id: str) -> Optional[Tuple[List[dict], int]]:
+        """
+        Send the tokens of an FCM batch that have no saved result yet
+
+        Tokens whose multicast failed as a whole are left without a result and
+        the batch is released for a later attempt (until max_attempts).
+
+        Returns:
+            (results in token order, tokens pruned over all attempts), or None if
+            the batch was released for a retry
+        """
+        payload = batch["payload"]
+        recipients = batch["recipients"]
+        progress = dict(batch.get("progress") or {})
+        pending = [index for index in range(len(recipients)) if str(index) not in progress]
+        tokens = [recipients[index] for index in pending]
+
+        result = await asyncio.to_thread(
+            fcm_service.notify_donor_match,
+            tokens, payload["blood_type"], payload["requester_name"], payload["location"]
+        )
+        retry = set(result.get("batch_failed") or []) if batch["attempts"] < self.max_attempts else set()
+        for position, entry in enumerate(per_token_results(tokens, result)):
+            if position not in retry:
+                progress[str(pending[position])] = entry
+        tokens_pruned = batch.get("tokens_pruned", 0) + result.get("tokens_pruned", 0)
+
+        if retry:
+            logger.warning(f"Outbox batch {batch['_id']}: retrying {len(retry)} tokens from failed multicasts")
+            await outbox_collection.update_one(
+                {"_id": batch["_id"], "lease_owner": worker_id},
+                {"$set": {
+                    "status": "pending",
+                    "lease_until": _now() + timedelta(seconds=min(self.lease_seconds, 2 ** batch["attempts"])),
+                    "progress": progress,
+                    "tokens_pruned": tokens_pruned,
+                }},
+            )
+            return None
+        return [progress[str(index)] for index in range(len(recipients))], tokens_pruned
+
+    async def _send_topics(self, batch: dict, worker_id: str) -> Optional[List[dict]]:
+        """
+        Send the conditions of a topic batch that have no saved result yet
+
+        Failed conditions are left without a result and the batch is released
+        for a later attempt (until max_attempts).
+
+        Returns:
+            Results in condition order, or None if the batch was released for a retry
+        """
+        payload = batch["payload"]
+        recipients = batch["recipients"]
+        progress = dict(batch.get("progress") or {})
+        pending = [index for index in range(len(recipients)) if str(index) not in progress]
+        conditions = [recipients[index] for index in pending]
+
+        result = await asyncio.to_thread(
+            fcm_service.notify_emergency_broadcast,
+            conditions, payload["blood_type"], payload["location"]
+        )
+        retrying = batch["attempts"] < self.max_attempts
+        failed = 0
+        for position, entry in enumerate(per_token_results(conditions, result)):
+            if entry["success"] or not retrying:
+                progress[str(pending[position])] = entry
+            else:
+                failed += 1
+
+        if failed:
+            logger.warning(f"Outbox batch {batch['_id']}: retrying {failed} failed topic conditions")
+            await outbox_collection.update_one(
+                {"_id": batch["_id"], "lease_owner": worker_id},
+                {"$set": {
+                    "status": "pending",
+                    "lease_until": _now() + timedelta(seconds=min(self.lease_seconds, 2 ** batch["attempts"])),
+                    "progress": progress,
+                }},
+            )
+            return None
+        return [progress[str(index)] for index in range(len(recipients))]
+
+    async def _send(self, batch: dict, worker_id: str, lease_lost: threading.Event):
+        """Send one batch and record per-recipient results"""
+        recipients = batch["recipients"]
+        service = sms_service if batch["channel"] == CHANNEL_SMS else fcm_service
+        update = {}
+
+        if not service.enabled and service is fcm_service and firebase_configured():
+            # Firebase is configured but its startup step has not attached it yet (or is retrying):
+            # put the batch back without using up an attempt
+            await outbox_collection.update_one(
+                {"_id": batch["_id"], "lease_owner": worker_id},
+                {
+                    "$set": {"status": "pending", "lease_until": _now() + timedelta(seconds=NOT_READY_BACKOFF)},
+                    "$inc": {"attempts": -1},
+                },
+            )
+            return
+        if not service.enabled:
+            # Not configured: retrying will not help
+            status = "failed"
+            results = [
+                {"token": recipient, "success": False, "error": f"{batch['channel']} service not configured"}
+                for recipient in recipients
+            ]
+        elif batch["channel"] == CHANNEL_FCM:
+            sent = await self._send_fcm(batch, worker_id)
+            if sent is None:
+                # Released for another attempt at the tokens whose multicast batch failed
+                return
+            status = "delivered"
+            results, update["tokens_pruned"] = sent
+        elif batch["channel"] == CHANNEL_TOPIC:
+            results = await self._send_topics(batch, worker_id)
+            if results is None:
+                # Released for another attempt at the conditions that failed
+                return
+            status = "delivered"
+        else:
+            results = await self._send_sms(batch, worker_id, lease_lost)
+            if results is None:
+                # Another worker holds the batch now and resumes from the saved progress
+                return
+            status = "delivered"
+
+        await outbox_collection.update_one(
+            {"_id": batch["_id"], "lease_owner": worker_id},
+            {"$set": {"status": status, "delivered_at": _now(), "results": results, **update}},
+        )
+
+
+# Global outbox instance
+notification_outbox = NotificationOutbox(
+    workers=int(os.getenv("OUTBOX_WORKERS", "2")),
+    lease_seconds=float(os.getenv("OUTBOX_LEASE_SECONDS", "120")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+)
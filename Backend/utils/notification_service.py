@@ -5,19 +5,84 @@ Send push notifications to multiple users via Firebase
 
 import os
 import json
+import time
+import random
 import logging
-from typing import List, Dict, Optional
-from firebase_admin import messaging
-import firebase_admin
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+from pymongo import UpdateMany
+from database.connection import sync_donor_collection
+from utils.donor_index import donor_index
+from utils.metrics import stage_timer, count_notifications
+
+# firebase_admin is imported on first use (it adds ~0.5 s to startup); this one is for type hints only
+if TYPE_CHECKING:
+    from firebase_admin import messaging
 
 logger = logging.getLogger(__name__)
 
+# FCM rejects multicast messages addressed to more than 500 tokens
+FCM_MULTICAST_LIMIT = 500
+
+
+@lru_cache(maxsize=None)
+def dead_token_errors() -> tuple:
+    """Per-token errors after which a token will never work again"""
+    from firebase_admin import messaging
+    return (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+
+
+@lru_cache(maxsize=None)
+def transient_errors() -> tuple:
+    """Per-token errors worth retrying"""
+    from firebase_admin import messaging, exceptions
+    return (
+        messaging.QuotaExceededError,
+        exceptions.UnavailableError,
+        exceptions.InternalError,
+        exceptions.DeadlineExceededError,
+        exceptions.UnknownError,
+    )
+
+
+def is_dead_token(response: "messaging.SendResponse") -> bool:
+    """True if FCM says this token is unregistered, foreign or malformed"""
+    from firebase_admin import exceptions
+    error = response.exception
+    if isinstance(error, dead_token_errors()):
+        return True
+    # Malformed tokens come back as INVALID_ARGUMENT; other invalid arguments are payload bugs
+    return isinstance(error, exceptions.InvalidArgumentError) and "registration token" in str(error)
+
+
+def is_transient_failure(response: "messaging.SendResponse") -> bool:
+    """True if the send failed for a reason that may succeed on retry"""
+    return isinstance(response.exception, transient_errors())
+
 
 class FirebaseNotificationService:
     """Service for sending push notifications via Firebase Cloud Messaging"""
     
     def __init__(self):
         """Initialize FCM service"""
+        # Number of 500-token batches sent at the same time
+        self.max_parallel_batches = int(os.getenv("FCM_MULTICAST_CONCURRENCY", "4"))
+        # Retry rounds for transient per-token failures, first backoff in seconds (doubles each round)
+        self.max_retries = int(os.getenv("FCM_MAX_RETRIES", "3"))
+        self.retry_backoff = float(os.getenv("FCM_RETRY_BACKOFF", "0.5"))
+        self.metrics = {"sent": 0, "failed": 0, "transient_retries": 0, "tokens_pruned": 0}
+        # Disabled until attach_app() runs after initialize_firebase() (see main.py startup)
+        self.enabled = False
+    
+    def attach_app(self) -> bool:
+        """
+        Enable the service if this process has a Firebase app
+        
+        The service is created at import time, before the startup event runs
+        initialize_firebase(), so each worker calls this afterwards.
+        """
+        import firebase_admin
         try:
             # Check if Firebase is already initialized
             firebase_admin.get_app()
@@ -26,6 +91,7 @@ class FirebaseNotificationService:
         except ValueError:
             logger.warning("Firebase not initialized. Notification service disabled.")
             self.enabled = False
+        return self.enabled
     
     def send_notification(
         self,
@@ -49,6 +115,7 @@ class FirebaseNotificationService:
         if not self.enabled:
             return {"success": False, "error": "FCM service not initialized"}
         
+        from firebase_admin import messaging
         try:
             message = messaging.Message(
                 notification=messaging.Notification(
@@ -59,8 +126,10 @@ class FirebaseNotificationService:
                 token=token
             )
             
-            response = messaging.send(message)
+            with stage_timer("fcm_multicast"):
+                response = messaging.send(message)
             logger.info(f"Notification sent successfully. Message ID: {response}")
+            count_notifications("fcm", 1, 0)
             
             return {
                 "success": True,
@@ -69,6 +138,9 @@ class FirebaseNotificationService:
         
         except Exception as e:
             logger.error(f"Failed to send notification: {str(e)}")
+            count_notifications("fcm", 0, 1)
+            if isinstance(e, dead_token_errors()):
+                self.prune_dead_tokens([token])
             return {
                 "success": False,
                 "error": str(e)
@@ -84,6 +156,9 @@ class FirebaseNotificationService:
         """
         Send notification to multiple devices
         
+        Tokens are split into batches of at most 500 (the FCM limit) that are
+        sent concurrently, up to FCM_MULTICAST_CONCURRENCY batches at a time.
+        
         Args:
             tokens: List of device FCM tokens
             title: Notification title
@@ -91,42 +166,139 @@ class FirebaseNotificationService:
             data: Optional additional data
             
         Returns:
-            dict with success/failure counts
+            dict with success/failure counts, pruned dead tokens and one response per token (in token order).
+            'success' is False if any batch failed to send as a whole; 'batch_failed' lists the
+            indexes of those tokens so callers can retry just them
         """
         if not self.enabled:
             return {"success": False, "error": "FCM service not initialized"}
         
-        try:
+        if not tokens:
+            return {"success": True, "success_count": 0, "failure_count": 0, "total": 0, "responses": []}
+        
+        batches = [
+            tokens[i:i + FCM_MULTICAST_LIMIT]
+            for i in range(0, len(tokens), FCM_MULTICAST_LIMIT)
+        ]
+        with stage_timer("fcm_multicast"):
+            responses, raised = self._send_batches(batches, title, body, data)
+        
+        # Retry tokens that failed for transient reasons (quota, unavailable, ...) with backoff
+        retries = 0
+        retry_indexes = [i for i, r in enumerate(responses) if is_transient_failure(r)]
+        while retry_indexes and retries < self.max_retries:
+            time.sleep(self.retry_backoff * (2 ** retries) * random.uniform(0.5, 1.5))
+            retries += 1
+            retry_tokens = [tokens[i] for i in retry_indexes]
+            retry_batches = [
+                retry_tokens[i:i + FCM_MULTICAST_LIMIT]
+                for i in range(0, len(retry_tokens), FCM_MULTICAST_LIMIT)
+            ]
+            with stage_timer("fcm_multicast"):
+                retry_responses, retry_raised = self._send_batches(retry_batches, title, body, data)
+            for i, response, batch_raised in zip(retry_indexes, retry_responses, retry_raised):
+                responses[i] = response
+                raised[i] = batch_raised
+            self.metrics["transient_retries"] += len(retry_indexes)
+            retry_indexes = [i for i in retry_indexes if is_transient_failure(responses[i])]
+        
+        success_count = sum(1 for response in responses if response.success)
+        failure_count = len(responses) - success_count
+        batch_failed = [i for i, batch_raised in enumerate(raised) if batch_raised and not responses[i].success]
+        
+        # Tokens FCM reports as permanently dead are removed from the donor documents
+        dead_tokens = sorted({tokens[i] for i, r in enumerate(responses) if is_dead_token(r)})
+        tokens_pruned = self.prune_dead_tokens(dead_tokens) if dead_tokens else 0
+        
+        self.metrics["sent"] += success_count
+        self.metrics["failed"] += failure_count
+        count_notifications("fcm", success_count, failure_count)
+        
+        logger.info(
+            f"Multicast sent in {len(batches)} batches: {success_count} successful, "
+            f"{failure_count} failed out of {len(tokens)} "
+            f"({retries} retry rounds, {len(dead_tokens)} dead tokens, "
+            f"{len(batch_failed)} in failed batches)"
+        )
+        
+        result = {
+            "success": not batch_failed,
+            "success_count": success_count,
+            "failure_count": failure_count,
+            "total": len(tokens),
+            "batches": len(batches),
+            "retry_rounds": retries,
+            "dead_tokens": dead_tokens,
+            "tokens_pruned": tokens_pruned,
+            "batch_failed": batch_failed,
+            "responses": responses
+        }
+        if batch_failed:
+            result["error"] = f"{len(batch_failed)} tokens were in multicast batches that failed to send"
+        return result
+    
+    def _send_batches(
+        self,
+        batches: List[List[str]],
+        title: str,
+        body: str,
+        data: Optional[Dict]
+    ) -> Tuple[List["messaging.SendResponse"], List[bool]]:
+        """
+        Send each batch as one multicast (concurrently)
+        
+        Returns:
+            (responses in token order, per token: True if its whole batch raised)
+        """
+        from firebase_admin import messaging
+        
+        def send_batch(batch: List[str]) -> Tuple[List["messaging.SendResponse"], bool]:
             message = messaging.MulticastMessage(
                 notification=messaging.Notification(
                     title=title,
                     body=body
                 ),
                 data=data or {},
-                tokens=tokens
-            )
-            
-            response = messaging.send_multicast(message)
-            
-            logger.info(
-                f"Multicast sent: {response.success_count} successful, "
-                f"{response.failure_count} failed out of {len(tokens)}"
+                tokens=batch
             )
-            
-            return {
-                "success": True,
-                "success_count": response.success_count,
-                "failure_count": response.failure_count,
-                "total": len(tokens),
-                "responses": response.responses
-            }
+            try:
+                return _send_each_for_multicast(message).responses, False
+            except Exception as e:
+                # Keep the other batches; mark every token of this one as failed
+                logger.error(f"Failed to send multicast batch of {len(batch)}: {str(e)}")
+                return [messaging.SendResponse(None, e) for _ in batch], True
+        
+        if len(batches) == 1:
+            batch_responses = [send_batch(batches[0])]
+        else:
+            workers = max(1, min(self.max_parallel_batches, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fcm-multicast") as pool:
+                batch_responses = list(pool.map(send_batch, batches))
+        
+        responses = [response for batch, _ in batch_responses for response in batch]
+        raised = [batch_raised for batch, batch_raised in batch_responses for _ in batch]
+        return responses, raised
+    
+    def prune_dead_tokens(self, dead_tokens: List[str]) -> int:
+        """
+        Unset fcm_token on every donor holding one of `dead_tokens` (one bulk_write)
         
+        Returns:
+            Number of donor documents updated
+        """
+        try:
+            result = sync_donor_collection.bulk_write(
+                [UpdateMany({"fcm_token": token}, {"$unset": {"fcm_token": ""}}) for token in dead_tokens],
+                ordered=False
+            )
         except Exception as e:
-            logger.error(f"Failed to send multicast: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            logger.error(f"Failed to prune {len(dead_tokens)} dead FCM tokens: {str(e)}")
+            return 0
+        
+        donor_index.discard_tokens(dead_tokens)
+        self.metrics["tokens_pruned"] += result.modified_count
+        logger.info(f"Pruned {result.modified_count} dead FCM tokens")
+        return result.modified_count
     
     def send_to_topic(
         self,
@@ -147,6 +319,7 @@ class FirebaseNotificationService:
         if not self.enabled:
             return {"success": False, "error": "FCM service not initialized"}
         
+        from firebase_admin import messaging
         try:
             message = messaging.Message(
                 notification=messaging.Notification(
@@ -173,11 +346,64 @@ class FirebaseNotificationService:
                 "error": str(e)
             }
     
+    def send_to_condition(
+        self,
+        condition: str,
+        title: str,
+        body: str,
+        data: Optional[Dict] = None
+    ) -> dict:
+        """
+        Send one notification to every device matching a topic condition
+        
+        Args:
+            condition: e.g. "'blood-type-o-negative' in topics && 'region-109-252' in topics"
+            title: Notification title
+            body: Notification body
+            data: Optional data
+        """
+        if not self.enabled:
+            return {"success": False, "error": "FCM service not initialized"}
+        
+        from firebase_admin import messaging
+        try:
+            message = messaging.Message(
+                notification=messaging.Notification(
+                    title=title,
+                    body=body
+                ),
+                data=data or {},
+                condition=condition
+            )
+            
+            with stage_timer("fcm_multicast"):
+                response = messaging.send(message)
+            logger.info(f"Condition notification sent to {condition}. Message ID: {response}")
+            
+            return {
+                "success": True,
+                "message_id": response,
+                "condition": condition
+            }
+        
+        except Exception as e:
+            logger.error(f"Failed to send condition notification: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     def subscribe_to_topic(self, tokens: List[str], topic: str) -> dict:
-        """Subscribe devices to a topic"""
+        """
+        Subscribe up to 1000 devices to a topic
+        
+        Returns:
+            dict with success/failure counts and the tokens FCM rejected
+        """
         if not self.enabled:
             return {"success": False, "error": "FCM service not initialized"}
         
+        from firebase_admin import messaging
         try:
             response = messaging.subscribe_to_topic(tokens, topic)
             logger.info(f"Subscribed {response.success_count} devices to topic '{topic}'")
@@ -185,7 +411,8 @@ class FirebaseNotificationService:
             return {
                 "success": True,
                 "success_count": response.success_count,
-                "failure_count": response.failure_count
+                "failure_count": response.failure_count,
+                "failed_tokens": [tokens[error.index] for error in response.errors]
             }
         
         except Exception as e:
@@ -231,6 +458,18 @@ class FirebaseNotificationService:
         
         return self.send_notification(token, title, body, data)
     
+    def notify_donors_registered(self, tokens: List[str], blood_type: str) -> dict:
+        """Welcome notification for many new donors of one blood type (bulk imports)"""
+        title = "🩸 Welcome to Blood Buddy!"
+        body = f"Thank you for registering as a {blood_type} donor!"
+        
+        data = {
+            "type": "welcome",
+            "blood_type": blood_type
+        }
+        
+        return self.send_multicast(tokens, title, body, data)
+    
     def notify_request_confirmed(
         self,
         requester_token: str,
@@ -255,18 +494,71 @@ class FirebaseNotificationService:
         location: str
     ) -> dict:
         """Send emergency alert to all donors of specific blood type"""
-        title = f"🚨 URGENT: {blood_type} Blood Needed!"
-        body = f"Critical need at {location}. Please respond if available!"
+        title, body, data = emergency_message(blood_type, location)
+        return self.send_to_topic(topic, title, body, data)
+    
+    def notify_emergency_broadcast(
+        self,
+        conditions: List[str],
+        blood_type: str,
+        location: str
+    ) -> dict:
+        """
+        Send an emergency alert to every donor matching any of `conditions`
         
-        data = {
-            "type": "emergency",
-            "blood_type": blood_type,
-            "location": location,
-            "priority": "high",
-            "action_url": "/emergency-response"
-        }
+        One send per condition, however many donors are subscribed.
         
-        return self.send_to_topic(topic, title, body, data)
+        Returns:
+            dict shaped like send_multicast's result, one response per condition;
+            success is False when no condition could be sent
+        """
+        if not self.enabled:
+            return {"success": False, "error": "FCM service not initialized"}
+        
+        from firebase_admin import messaging
+        title, body, data = emergency_message(blood_type, location)
+        responses = []
+        for condition in conditions:
+            result = self.send_to_condition(condition, title, body, data)
+            responses.append(messaging.SendResponse(
+                {"name": result["message_id"]} if result["success"] else None,
+                None if result["success"] else Exception(result["error"])
+            ))
+        
+        success_count = sum(1 for response in responses if response.success)
+        count_notifications("fcm", success_count, len(responses) - success_count)
+        result = {
+            "success": success_count > 0,
+            "success_count": success_count,
+            "failure_count": len(responses) - success_count,
+            "total": len(conditions),
+            "responses": responses
+        }
+        if not success_count:
+            result["error"] = "No condition could be sent"
+        return result
+
+
+def emergency_message(blood_type: str, location: str) -> tuple:
+    """(title, body, data) of an emergency alert"""
+    title = f"🚨 URGENT: {blood_type} Blood Needed!"
+    body = f"Critical need at {location}. Please respond if available!"
+    
+    data = {
+        "type": "emergency",
+        "blood_type": blood_type,
+        "location": location,
+        "priority": "high",
+        "action_url": "/emergency-response"
+    }
+    return title, body, data
+
+
+def _send_each_for_multicast(message: "messaging.MulticastMessage") -> "messaging.BatchResponse":
+    """firebase-admin 6.2+ replaced send_multicast (since removed) with send_each_for_multicast"""
+    from firebase_admin import messaging
+    send = getattr(messaging, "send_each_for_multicast", None) or messaging.send_multicast
+    return send(message)
 
 
 # Global FCM service instance
@@ -291,7 +583,12 @@ def send_welcome_notification(token: str, donor_name: str, blood_type: str):
     return fcm_service.notify_donor_registered(token, donor_name, blood_type)
 
 
+def send_bulk_welcome_notification(tokens: List[str], blood_type: str):
+    """Quick function to welcome a batch of imported donors with one multicast"""
+    return fcm_service.notify_donors_registered(tokens, blood_type)
+
+
 def send_emergency_alert(blood_type: str, location: str):
     """Quick function to send emergency alerts to topic subscribers"""
-    topic = f"blood-type-{blood_type.lower().replace('+', 'positive').replace('-', 'negative')}"
-    return fcm_service.send_emergency_alert(topic, blood_type, location)
+    from utils.topics import blood_group_topic
+    return fcm_service.send_emergency_alert(blood_group_topic(blood_type), blood_type, location)
@@ -0,0 +1,88 @@
+"""
+Opaque continuation tokens for distance-ordered donor searches
+A token records the search origin, the distance of the last donor
+returned and the ids of every donor returned at exactly that distance,
+so the next page can resume with $geoNear's minDistance instead of
+re-reading earlier pages.
+"""
+
+import json
+import base64
+import binascii
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+
+
+class InvalidCursor(ValueError):
+    """Raised when a continuation token cannot be decoded"""
+
+
+# (distance_km, ids, origin) as stored in a continuation token
+Cursor = Tuple[float, List, Tuple[float, float]]
+
+
+def encode_cursor(distance_km: float, ids: List, origin: Tuple[float, float]) -> str:
+    """
+    Build the continuation token for the page that ended at distance_km
+
+    Args:
+        distance_km: Raw $geoNear distance of the last donor on the page
+        ids: _id of every donor on the page at exactly that distance
+        origin: (lat, lon) the distances were measured from
+    """
+    raw = json.dumps(
+        {"d": distance_km, "ids": [str(i) for i in ids], "o": list(origin)}, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """
+    Inverse of encode_cursor
+
+    Returns:
+        (distance_km, ids, origin) with ids converted back to ObjectId where possible
+
+    Raises:
+        InvalidCursor: if the token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        distance_km = float(data["d"])
+        ids = [ObjectId(i) if ObjectId.is_valid(i) else i for i in data["ids"]]
+        origin = (float(data["o"][0]), float(data["o"][1]))
+    except (binascii.Error, ValueError, KeyError, IndexError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+    return distance_km, ids, origin
+
+
+def after_cursor_stages(after: Optional[Cursor]) -> List[dict]:
+    """$match stage dropping donors already returned before the cursor (none without a cursor)"""
+    if after is None:
+        return []
+    distance_km, ids, _ = after
+    return [{"$match": {"distance_km": {"$gte": distance_km}, "_id": {"$nin": ids}}}]
+
+
+def next_cursor(
+    donors: List[dict],
+    page_size: int,
+    origin: Tuple[float, float],
+    after: Optional[Cursor] = None
+) -> Optional[str]:
+    """
+    Continuation token after a distance-ordered page, or None on the last page
+
+    `donors` must still carry '_id' and the raw 'distance_km' from $geoNear
+    measured from `origin`; `after` is the cursor the page was read from
+    (ties may span pages).
+    """
+    if len(donors) < page_size or not donors:
+        return None
+    last_distance = donors[-1]["distance_km"]
+    tied_ids = [d["_id"] for d in donors if d["distance_km"] == last_distance]
+    if after is not None and after[0] == last_distance:
+        tied_ids = after[1] + tied_ids
+    return encode_cursor(last_distance, tied_ids, origin)
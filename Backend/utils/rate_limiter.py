@@ -0,0 +1,53 @@
+"""
+Thread-safe token bucket rate limiter
+Used to keep outbound API calls (e.g. Twilio messages) under an account's per-second limit
+"""
+
+import time
+import threading
+
+
+class TokenBucket:
+    """Allows `rate` operations per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum stored tokens (defaults to one second's worth)
+
+        Raises:
+            ValueError: if rate is not positive
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` if available right now, without waiting"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,73 @@
+"""
+Startup and readiness tracking
+Slow startup steps (Firebase, MongoDB indexes) run as background tasks so
+the process serves liveness checks immediately; /ready reports each
+dependency until they have all come up.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupTracker:
+    """Runs named startup steps in the background and records their outcome"""
+
+    def __init__(self):
+        self._steps: Dict[str, dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.started_at = time.time()
+
+    def run_in_background(self, name: str, step: Callable[[], Awaitable], retry_interval: Optional[float] = None):
+        """
+        Start `step` as a task; its state is PENDING until it returns
+
+        Args:
+            name: Dependency name reported by /ready
+            step: Coroutine function performing the step
+            retry_interval: Seconds between attempts if the step raises (None = give up)
+        """
+        self._steps[name] = {"status": PENDING, "seconds": None, "error": None}
+
+        async def _run():
+            started = time.perf_counter()
+            while True:
+                try:
+                    await step()
+                    self._steps[name].update(
+                        status=READY, seconds=round(time.perf_counter() - started, 3), error=None
+                    )
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Startup step '{name}' failed: {e}")
+                    self._steps[name].update(status=FAILED, error=str(e))
+                    if retry_interval is None:
+                        return
+                    await asyncio.sleep(retry_interval)
+
+        self._tasks[name] = asyncio.create_task(_run(), name=f"startup-{name}")
+
+    def status(self, name: str) -> Optional[str]:
+        step = self._steps.get(name)
+        return step["status"] if step else None
+
+    def steps(self) -> Dict[str, dict]:
+        return {name: dict(step) for name, step in self._steps.items()}
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+# Global startup tracker instance
+startup = StartupTracker()
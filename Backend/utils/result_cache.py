@@ -0,0 +1,308 @@
+"""
+Response cache for hot /donors/nearby queries
+Hospitals poll the same few locations for the same blood groups; first
+pages are cached per (blood_group, quantized location, limit, compatible,
+donor version) with a TTL and invalidated by grid-cell tags when a donor is
+added nearby.
+"""
+
+import os
+import json
+import math
+import time
+import bisect
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.donor_index import donor_index
+
+logger = logging.getLogger(__name__)
+
+# Tag meaning "any blood group" / "any cell"
+ANY = "*"
+
+# Entries whose donors span more grid cells than this are tagged as covering every cell
+MAX_TAG_CELLS = 64
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds), cumulative like Prometheus buckets"""
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(list(self.BUCKETS_MS) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[f"le_{bound}"] = cumulative
+        return {
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+            "buckets": buckets,
+        }
+
+
+class MemoryCacheBackend:
+    """In-process TTL + LRU store with a tag -> keys index for invalidation"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, object, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self.evictions = 0
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value, ttl: float, tags: Iterable[str]):
+        self._drop(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.get(tag, set())
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Redis-compatible store shared by every worker
+
+    Size bounds and LRU eviction are left to the server's maxmemory policy
+    (e.g. allkeys-lru); tag sets expire with the entries they point to.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "bb:nearby:"):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    async def get(self, key: str):
+        raw = await self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value, ttl: float, tags: Iterable[str]):
+        ttl_ms = int(ttl * 1000)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.set(self.prefix + key, json.dumps(value, default=str), px=ttl_ms)
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            pipe.sadd(tag_key, key)
+            pipe.pexpire(tag_key, ttl_ms)
+        await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tag_keys = [f"{self.prefix}tag:{tag}" for tag in tags]
+        pipe = self._redis.pipeline(transaction=False)
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        members = await pipe.execute()
+        keys = {self.prefix + (k.decode() if isinstance(k, bytes) else k) for group in members for k in group}
+        if keys or tag_keys:
+            await self._redis.delete(*keys, *tag_keys)
+        return len(keys)
+
+    async def clear(self):
+        async for key in self._redis.scan_iter(match=self.prefix + "*", count=1000):
+            await self._redis.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class NearbyResultCache:
+    """Cache of first result pages of /donors/nearby, keyed by a quantized location"""
+
+    def __init__(self, backend=None, ttl: float = 30.0, grid_deg: float = 0.01):
+        """
+        Args:
+            backend: MemoryCacheBackend, RedisCacheBackend or None to disable caching
+            ttl: Seconds an entry is served before it is recomputed
+            grid_deg: Quantization step for lat/lon (0.01 deg ~ 1.1 km)
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.grid_deg = grid_deg
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.latency = {"hit": LatencyHistogram(), "miss": LatencyHistogram(), "uncached": LatencyHistogram()}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def snap(self, lat: float, lon: float) -> Tuple[float, float]:
+        """Centre of the quantization cell containing (lat, lon); cached pages are computed there"""
+        return (
+            (math.floor(lat / self.grid_deg) + 0.5) * self.grid_deg,
+            (math.floor(lon / self.grid_deg) + 0.5) * self.grid_deg,
+        )
+
+    def key(self, blood_group: Optional[str], lat: float, lon: float, limit: int, compatible: bool, version: int) -> str:
+        """
+        Cache key of a first page; `version` is the donor collection version of the
+        response's ETag, so a page cached before another worker's write is never
+        served under the newer ETag
+        """
+        row, col = math.floor(lat / self.grid_deg), math.floor(lon / self.grid_deg)
+        return f"{blood_group or ANY}|{row}|{col}|{limit}|{int(compatible)}|{version}"
+
+    @staticmethod
+    def _cell_tag(blood_group: str, cell) -> str:
+        return f"{blood_group}|{cell[0]}:{cell[1]}"
+
+    def tags_for(self, blood_groups: List[str], lat: float, lon: float, radius_km: Optional[float]) -> List[str]:
+        """
+        Tags of an entry whose donors all lie within radius_km of (lat, lon)
+
+        A page shorter than its limit (radius_km None) could grow with a donor
+        added anywhere, so it is tagged with the ANY cell.
+        """
+        groups = blood_groups or [ANY]
+        cells = donor_index.cells_within(lat, lon, radius_km) if radius_km is not None else None
+        if cells is None or len(cells) > MAX_TAG_CELLS:
+            return [f"{group}|{ANY}" for group in groups]
+        return [self._cell_tag(group, cell) for group in groups for cell in cells]
+
+    async def get(self, key: str):
+        if not self.enabled:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Nearby cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value, tags: List[str]):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set(key, value, self.ttl, tags)
+        except Exception as e:
+            logger.warning(f"Nearby cache write failed: {e}")
+
+    async def invalidate_donor(self, blood_group: str, lat: float, lon: float):
+        """Drop entries that a new donor of `blood_group` at (lat, lon) could appear in"""
+        if not self.enabled:
+            return
+        cell = donor_index.cell_of(lat, lon)
+        tags = [
+            self._cell_tag(blood_group, cell), self._cell_tag(ANY, cell),
+            f"{blood_group}|{ANY}", f"{ANY}|{ANY}",
+        ]
+        try:
+            self.invalidated += await self.backend.invalidate_tags(tags)
+        except Exception as e:
+            logger.warning(f"Nearby cache invalidation failed: {e}")
+
+    async def clear(self):
+        """Drop every entry (e.g. after a bulk import)"""
+        if not self.enabled:
+            return
+        try:
+            await self.backend.clear()
+        except Exception as e:
+            logger.warning(f"Nearby cache clear failed: {e}")
+
+    def observe(self, outcome: str, seconds: float):
+        """Record request latency for 'hit', 'miss' or 'uncached' (cursor/stream) responses"""
+        self.latency[outcome].observe(seconds)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and latency histograms for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.enabled else None,
+            "entries": self.backend.size() if self.enabled else 0,
+            "ttl_seconds": self.ttl,
+            "grid_deg": self.grid_deg,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidated": self.invalidated,
+            "evictions": self.backend.evictions if self.enabled else 0,
+            "latency_ms": {outcome: h.snapshot() for outcome, h in self.latency.items()},
+        }
+
+
+def build_cache_backend(kind: str, max_entries: int, url: str):
+    """Backend named by NEARBY_CACHE_BACKEND: 'memory', 'redis' or 'off'"""
+    if kind == "off":
+        return None
+    if kind == "redis":
+        try:
+            return RedisCacheBackend(url)
+        except ImportError:
+            logger.warning("redis package not installed, using the in-memory nearby cache")
+    return MemoryCacheBackend(max_entries)
+
+
+# Global nearby cache instance
+nearby_cache = NearbyResultCache(
+    backend=build_cache_backend(
+        os.getenv("NEARBY_CACHE_BACKEND", "memory"),
+        int(os.getenv("NEARBY_CACHE_SIZE", "10000")),
+        os.getenv("NEARBY_CACHE_URL", "redis://localhost:6379/0"),
+    ),
+    ttl=float(os.getenv("NEARBY_CACHE_TTL", "30")),
+    grid_deg=float(os.getenv("NEARBY_CACHE_GRID_DEG", "0.01")),
+)
@@ -4,13 +4,24 @@ Sends SMS notifications to blood donors and requesters
 """
 
 import os
-from twilio.rest import Client
-from typing import List, Optional
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from twilio.base.exceptions import TwilioRestException
+from typing import Callable, Iterator, List, Optional, Tuple
 import logging
+from utils.rate_limiter import TokenBucket
+from utils.metrics import stage_timer, count_notifications
 
 logger = logging.getLogger(__name__)
 
 
+def _is_retryable(error: Exception) -> bool:
+    """Twilio rate limiting (429) and server errors (5xx) are worth retrying"""
+    return isinstance(error, TwilioRestException) and (error.status == 429 or error.status >= 500)
+
+
 class SMSService:
     """Service for sending SMS notifications via Twilio"""
     
@@ -20,19 +31,48 @@ class SMSService:
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.phone_number = os.getenv('TWILIO_PHONE_NUMBER')
         
+        # Match the account's messages-per-second limit; bulk sends use a thread pool.
+        # Every worker process has its own bucket, so each gets an equal share of the limit
+        self.rate_limiter = TokenBucket(
+            float(os.getenv('TWILIO_MESSAGES_PER_SECOND', '1')) / max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+        )
+        self.bulk_concurrency = int(os.getenv('SMS_BULK_CONCURRENCY', '8'))
+        self.max_retries = int(os.getenv('SMS_MAX_RETRIES', '3'))
+        self.retry_backoff = float(os.getenv('SMS_RETRY_BACKOFF', '1.0'))
+        
+        # The Twilio client (and twilio.rest, ~0.2 s to import) is created on the first send
+        self._client = None
+        self._client_lock = threading.Lock()
+        
         if not all([self.account_sid, self.auth_token, self.phone_number]):
             logger.warning("Twilio credentials not configured. SMS service disabled.")
             self.enabled = False
-            self.client = None
         else:
-            try:
-                self.client = Client(self.account_sid, self.auth_token)
-                self.enabled = True
-                logger.info("SMS service initialized successfully")
-            except Exception as e:
-                logger.error(f"Failed to initialize Twilio client: {e}")
-                self.enabled = False
-                self.client = None
+            self.enabled = True
+    
+    @property
+    def client(self):
+        """Twilio REST client, created on first use"""
+        if self._client is None and self.enabled:
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        from twilio.rest import Client
+                        self._client = Client(self.account_sid, self.auth_token)
+                        logger.info("SMS service initialized successfully")
+                    except Exception as e:
+                        logger.error(f"Failed to initialize Twilio client: {e}")
+                        self.enabled = False
+        return self._client
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+    
+    @property
+    def client_ready(self) -> bool:
+        """True once the Twilio client has been created"""
+        return self._client is not None
     
     def send_sms(self, to: str, message: str) -> dict:
         """
@@ -52,38 +92,85 @@ class SMSService:
                 "error": "SMS service not configured"
             }
         
-        try:
-            # Send message
-            message_response = self.client.messages.create(
-                body=message,
-                from_=self.phone_number,
-                to=to
-            )
+        attempt = 0
+        while True:
+            try:
+                # Wait for a slot under the account rate limit, then send
+                self.rate_limiter.acquire()
+                with stage_timer("sms_send"):
+                    message_response = self.client.messages.create(
+                        body=message,
+                        from_=self.phone_number,
+                        to=to
+                    )
+                break
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    logger.error(f"Failed to send SMS to {to}: {str(e)}")
+                    count_notifications("sms", 0, 1)
+                    return {
+                        "success": False,
+                        "error": str(e)
+                    }
+                attempt += 1
+                delay = self.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"SMS to {to} failed with HTTP {e.status}, retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+        
+        logger.info(f"SMS sent successfully to {to}. SID: {message_response.sid}")
+        count_notifications("sms", 1, 0)
+        return {
+            "success": True,
+            "message_sid": message_response.sid,
+            "status": message_response.status
+        }
+    
+    def iter_bulk_sms(self, recipients: List[str], message: str) -> Iterator[Tuple[int, dict]]:
+        """
+        Send SMS to multiple recipients concurrently, yielding results as they complete
+        
+        Sends run on SMS_BULK_CONCURRENCY threads and share the account rate limiter.
+        
+        Args:
+            recipients: List of phone numbers
+            message: SMS message content
             
-            logger.info(f"SMS sent successfully to {to}. SID: {message_response.sid}")
-            return {
-                "success": True,
-                "message_sid": message_response.sid,
-                "status": message_response.status
-            }
+        Yields:
+            (index into recipients, {"recipient": ..., "result": ...}) in completion order
+        """
+        if not recipients:
+            return
         
-        except Exception as e:
-            logger.error(f"Failed to send SMS to {to}: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e)
+        workers = max(1, min(self.bulk_concurrency, len(recipients)))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sms-bulk")
+        try:
+            futures = {
+                pool.submit(self.send_sms, recipient, message): index
+                for index, recipient in enumerate(recipients)
             }
+            for future in as_completed(futures):
+                index = futures[future]
+                yield index, {"recipient": recipients[index], "result": future.result()}
+        finally:
+            # Stops queued sends if the caller stops consuming early
+            pool.shutdown(wait=False, cancel_futures=True)
     
-    def send_bulk_sms(self, recipients: List[str], message: str) -> dict:
+    def send_bulk_sms(
+        self,
+        recipients: List[str],
+        message: str,
+        on_progress: Optional[Callable[[int, int, dict], None]] = None
+    ) -> dict:
         """
         Send SMS to multiple recipients
         
         Args:
             recipients: List of phone numbers
             message: SMS message content
+            on_progress: Optional callback(done, total, detail) called as each send completes
             
         Returns:
-            dict with success count, failed count, and details
+            dict with success count, failed count, and details (in recipient order)
         """
         if not self.enabled:
             return {
@@ -95,19 +182,19 @@ class SMSService:
             "total": len(recipients),
             "successful": 0,
             "failed": 0,
-            "details": []
+            "details": [None] * len(recipients)
         }
         
-        for recipient in recipients:
-            result = self.send_sms(recipient, message)
-            if result["success"]:
+        done = 0
+        for index, detail in self.iter_bulk_sms(recipients, message):
+            if detail["result"]["success"]:
                 results["successful"] += 1
             else:
                 results["failed"] += 1
-            results["details"].append({
-                "recipient": recipient,
-                "result": result
-            })
+            results["details"][index] = detail
+            done += 1
+            if on_progress:
+                on_progress(done, len(recipients), detail)
         
         return results
     
@@ -147,6 +234,41 @@ Thank you for saving lives!
         
         return self.send_sms(donor_phone, message)
     
+    def notify_donor_match_bulk(
+        self,
+        donor_phones: List[str],
+        blood_type: str,
+        requester_name: str,
+        location: str
+    ) -> dict:
+        """
+        Send the blood request match SMS to many donors at once
+        
+        Args:
+            donor_phones: Donors' phone numbers
+            blood_type: Blood type needed
+            requester_name: Name of person requesting blood
+            location: Location where blood is needed
+        """
+        return self.send_bulk_sms(donor_phones, self.donor_match_bulk_message(blood_type, requester_name, location))
+    
+    @staticmethod
+    def donor_match_bulk_message(blood_type: str, requester_name: str, location: str) -> str:
+        """Blood request match SMS sent to many donors (no per-donor greeting)"""
+        return f"""
+🩸 Blood Buddy Alert!
+
+Your {blood_type} blood is needed!
+
+Requester: {requester_name}
+Location: {location}
+
+Please respond if you can donate.
+Thank you for saving lives!
+
+- Blood Buddy Team
+        """.strip()
+    
     def notify_request_confirmation(
         self,
         requester_phone: str,
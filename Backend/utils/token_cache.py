@@ -0,0 +1,86 @@
+"""
+Cache of verified Firebase ID tokens
+Clients resend the same ID token for up to an hour; caching the decoded
+claims skips the RSA signature check on every request after the first.
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenCache:
+    """Size-bounded LRU cache whose entries expire at the token's own 'exp' claim"""
+
+    def __init__(self, max_entries: int = 10000, max_ttl: float = 3600.0):
+        """
+        Args:
+            max_entries: Maximum cached tokens (0 disables the cache)
+            max_ttl: Upper bound on how long an entry is trusted, in seconds
+        """
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # Never keep raw bearer tokens in memory longer than needed
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Cached user info for `token`, or None if unknown or expired"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: dict, exp: Optional[float]):
+        """
+        Cache user info for a freshly verified token
+
+        Args:
+            token: The raw ID token
+            user: Value to return on later hits
+            exp: The token's 'exp' claim (seconds since epoch)
+        """
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+
+        with self._lock:
+            self._entries[self._key(token)] = (expires_at, user)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
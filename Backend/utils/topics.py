@@ -0,0 +1,222 @@
+"""
+FCM topic subscriptions for emergency broadcasts
+Every donor with an FCM token is subscribed to a blood group topic and a
+coarse region topic. An emergency request then reaches every matching
+donor with a handful of condition sends instead of one message per token.
+"""
+
+import os
+import re
+import math
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.connection import sync_donor_collection
+from utils.notification_service import fcm_service
+
+logger = logging.getLogger(__name__)
+
+# FCM accepts at most 1000 tokens per subscribe call
+FCM_SUBSCRIBE_LIMIT = 1000
+
+# FCM allows at most 5 topics in one condition expression
+FCM_CONDITION_TOPIC_LIMIT = 5
+
+# Region cell size in degrees (1 deg of latitude ~ 111 km). Changing it orphans
+# existing region subscriptions: re-run the backfill with --force afterwards
+REGION_DEG = float(os.getenv("TOPIC_REGION_DEG", "1.0"))
+
+KM_PER_DEG_LAT = 111.32
+
+
+def blood_group_topic(blood_group: str) -> str:
+    """Topic for one blood group, e.g. "AB+" -> "blood-type-ab-positive" """
+    name = blood_group.strip().lower()
+    if name.endswith("+"):
+        name = name[:-1] + "-positive"
+    elif name.endswith("-"):
+        name = name[:-1] + "-negative"
+    return "blood-type-" + re.sub(r"[^a-z0-9-]", "", name)
+
+
+def _region_cell(lat: float, lon: float) -> Tuple[int, int]:
+    # Offset so cell numbers are never negative (topic names cannot contain '.')
+    return math.floor((lat + 90) / REGION_DEG), math.floor((lon + 180) / REGION_DEG)
+
+
+def region_topic(lat: float, lon: float) -> str:
+    """Topic for the REGION_DEG x REGION_DEG cell containing (lat, lon)"""
+    row, col = _region_cell(lat, lon)
+    return f"region-{row}-{col}"
+
+
+def regions_within(lat: float, lon: float, radius_km: float) -> List[str]:
+    """Region topics of every cell that overlaps the bounding box of a circle"""
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    row_min, col_min = _region_cell(max(lat - dlat, -90), lon - dlon)
+    row_max, col_max = _region_cell(min(lat + dlat, 90), lon + dlon)
+    cols_per_turn = round(360 / REGION_DEG)
+    return [
+        f"region-{row}-{col % cols_per_turn}"
+        for row in range(row_min, row_max + 1)
+        for col in range(col_min, col_max + 1)
+    ]
+
+
+def donor_topics(donor: dict) -> List[str]:
+    """Topics a donor document is subscribed to"""
+    return [blood_group_topic(donor["blood_group"]), region_topic(donor["latitude"], donor["longitude"])]
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _any_of(topics: List[str]) -> str:
+    expression = " || ".join(f"'{topic}' in topics" for topic in topics)
+    return f"({expression})" if len(topics) > 1 else expression
+
+
+def build_conditions(blood_groups: Iterable[str], regions: List[str]) -> List[str]:
+    """
+    FCM conditions reaching donors of any of `blood_groups` in any of `regions`
+
+    Each condition is (group topics OR'ed) && (region topics OR'ed) with at
+    most five topics in total; groups and regions are split so the number of
+    conditions (= sends) is as small as possible. A donor has one group and
+    one region, so nobody matches two conditions.
+    """
+    group_topics = list(dict.fromkeys(blood_group_topic(group) for group in blood_groups))
+    if not group_topics or not regions:
+        return []
+
+    best = None
+    for groups_per in range(1, FCM_CONDITION_TOPIC_LIMIT):
+        regions_per = FCM_CONDITION_TOPIC_LIMIT - groups_per
+        sends = math.ceil(len(group_topics) / groups_per) * math.ceil(len(regions) / regions_per)
+        if best is None or sends < best[0]:
+            best = (sends, groups_per, regions_per)
+    _, groups_per, regions_per = best
+
+    return [
+        f"{_any_of(groups)} && {_any_of(region_chunk)}"
+        for groups in _chunks(group_topics, groups_per)
+        for region_chunk in _chunks(regions, regions_per)
+    ]
+
+
+def subscribe_tokens(topic: str, tokens: List[str]) -> Tuple[int, int]:
+    """
+    Subscribe up to FCM_SUBSCRIBE_LIMIT tokens to `topic` and record it on their donors
+
+    Blocking; run it in a worker thread from async code.
+
+    Returns:
+        (subscribed, failed) token counts
+    """
+    result = fcm_service.subscribe_to_topic(tokens, topic)
+    if not result["success"]:
+        return 0, len(tokens)
+
+    failed = set(result.get("failed_tokens", []))
+    subscribed = [token for token in tokens if token not in failed]
+    if subscribed:
+        # Marks which donors the backfill can skip
+        sync_donor_collection.update_many(
+            {"fcm_token": {"$in": subscribed}}, {"$addToSet": {"topics": topic}}
+        )
+    return len(subscribed), len(failed)
+
+
+class TopicSubscriber:
+    """
+    Buffers new donors' tokens per topic and subscribes them in batches
+
+    Registrations arrive one at a time; a background task flushes every
+    topic once it has FCM_SUBSCRIBE_LIMIT tokens or flush_interval has
+    passed, so FCM sees one call per topic per interval, not one per donor.
+    Tokens still buffered at a crash are picked up by the backfill.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_pending: int = 100_000):
+        """
+        Args:
+            flush_interval: Seconds a token may wait for its batch to fill
+            max_pending: Buffered tokens beyond which new ones are left to the backfill
+        """
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.metrics = {"subscribed": 0, "failed": 0, "dropped": 0, "calls": 0}
+
+        self._pending: Dict[str, List[str]] = defaultdict(list)
+        self._pending_count = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def add(self, token: str, topics: List[str]):
+        """Queue one donor's token for its topics"""
+        if not token or not fcm_service.enabled:
+            return
+        if self._pending_count + len(topics) > self.max_pending:
+            self.metrics["dropped"] += len(topics)
+            return
+        for topic in topics:
+            tokens = self._pending[topic]
+            tokens.append(token)
+            if len(tokens) >= FCM_SUBSCRIBE_LIMIT and self._wakeup is not None:
+                self._wakeup.set()
+        self._pending_count += len(topics)
+
+    async def start(self):
+        """Start the flush task (call from the application startup event)"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="topic-subscriber")
+
+    async def stop(self):
+        """Stop the flush task after sending what is buffered"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final topic subscription flush failed: {e}")
+
+    async def flush(self):
+        """Subscribe every buffered token, one call per topic and 1000 tokens"""
+        pending, self._pending, self._pending_count = self._pending, defaultdict(list), 0
+        for topic, tokens in pending.items():
+            for chunk in _chunks(list(dict.fromkeys(tokens)), FCM_SUBSCRIBE_LIMIT):
+                subscribed, failed = await asyncio.to_thread(subscribe_tokens, topic, chunk)
+                self.metrics["calls"] += 1
+                self.metrics["subscribed"] += subscribed
+                self.metrics["failed"] += failed
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Topic subscription flush failed: {e}")
+
+
+# Global topic subscriber instance
+topic_subscriber = TopicSubscriber(
+    flush_interval=float(os.getenv("TOPIC_SUBSCRIBE_INTERVAL", "5")),
+)